@@ -1,9 +1,38 @@
+import os
 import random
+import time
+from chess.chess_engine import PIECES, NO_PIECE, PROMOTION, KIND_SHIFT, MOVED_SHIFT, CAPTURED_SHIFT, SEE_VALUES, \
+    CAPTURE_MOVES, QUIET_MOVES, ALL_MOVES
+from chess.transposition_table import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from chess.opening_book import OpeningBook
+from chess import bitbase, chess_engine, instrumentation
 
 pieceScore = {"K": 0, "Q": 9, "R": 5, "B":3, "N": 3, "P": 1}
-CHECKMATE = 1000
+CHECKMATE = 100000 #far above any centipawn evaluation
 STALEMATE = 0
 DEPTH = 2
+MAX_DEPTH = 64
+MAX_PLY = MAX_DEPTH + 32 #full width plies plus room for the capture sequences of the quiescence search
+#scores beyond this are mates, CHECKMATE minus the number of plies to the mate
+MATE_BOUND = CHECKMATE - MAX_PLY - 1
+DELTA_MARGIN = 200 #centipawns a capture may gain on top of its victim through the position, for delta pruning
+MATERIAL_DELTA_MARGIN = DELTA_MARGIN // 100 #the same margin in the pawn units of scoreMaterial
+TIME_LIMIT = 2.0 #seconds the AI gets per move by default
+KNOWN_WIN = 20000 #bitbase wins: above any evaluation, below the mate scores
+
+#Search's table, scores in the centipawns of GameState.evaluate; kept between moves so later searches reuse earlier
+#work, clear it when a new game starts
+transpositionTable = TranspositionTable()
+#findMoveMinMax keeps pawn scores, so it has a table of its own instead of reading Search's centipawns as pawns
+minMaxTable = TranspositionTable(4) #a few plies deep, a small table is plenty
+openingBook = None #set by loadOpeningBook; book moves are played without searching
+#KQK, KRK and KPK tables from python -m chess.bitbase generate, None when they have not been generated
+bitbases = bitbase.load(os.environ.get('CHESS_BITBASES', bitbase.DEFAULT_DIRECTORY))
+endgameProgress = False #set by findBestMoveMinMax when its root is in the bitbases
+#nodes of the last findBestMove or findBestMoveMinMax, full width and quiescence (findBestMove has none)
+nodeCounts = {'main': 0, 'quiescence': 0}
+#pieceScore by piece index, for scoring packed move codes
+PIECE_VALUES = [pieceScore[piece[1]] for piece in PIECES]
 
 
 
@@ -26,9 +55,11 @@ def findBestMove(gs, validMoves):
 
     opponentMinMaxScore = CHECKMATE
     bestPlayerMove = None
+    nodeCounts['main'] = nodeCounts['quiescence'] = 0
     random.shuffle(validMoves)
     for playerMove in validMoves:
         gs.makeMove(playerMove)
+        nodeCounts['main'] += 1
         opponentsMoves = gs.getValidMoves()
         if gs.stalemate:
             opponentMaxScore = STALEMATE
@@ -38,13 +69,14 @@ def findBestMove(gs, validMoves):
             opponentMaxScore = -CHECKMATE
             for opponentsMove in opponentsMoves:
                 gs.makeMove(opponentsMove)
-                gs.getValidMoves()
-                if gs.checkmate:
+                nodeCounts['main'] += 1
+                status = gs.gameStatus()
+                if status == chess_engine.CHECKMATE:
                     score = CHECKMATE
-                elif gs.stalemate:
+                elif status != chess_engine.ONGOING: #stalemate or a draw by rule
                     score = STALEMATE
                 else:
-                    score = -turnMultiplier * scoreMaterial(gs.board)
+                    score = -turnMultiplier * gs.material
                 if score > opponentMaxScore:
                     opponentMaxScore = score
                 gs.undoMove(opponentsMove)
@@ -59,7 +91,14 @@ def findBestMove(gs, validMoves):
 Helper method to make the first recursive call
 '''
 def findBestMoveMinMax(gs, validMoves):
-    global nextMove
+    global nextMove, endgameProgress
+    minMaxTable.newSearch()
+    endgameProgress = bitbases is not None and bitbases.probe(gs) is not None
+    nodeCounts['main'] = nodeCounts['quiescence'] = 0
+    nextMove = validMoves[0] if validMoves else None #kept when every move gets mated, instead of a stale move
+    if endgameProgress:
+        codes = keepBitbaseResult(gs, [move.code for move in validMoves])
+        validMoves = [move for move in validMoves if move.code in codes]
     findMoveMinMax(gs, validMoves, DEPTH, gs.whiteToMove)
 
 
@@ -69,35 +108,583 @@ def findBestMoveMinMax(gs, validMoves):
 
 def findMoveMinMax(gs, validMoves, depth, whiteToMove):
     global nextMove
+    if depth != DEPTH and gs.isDraw(1):
+        return STALEMATE
+    #as in Search, a root in the tables leaves the rest of the tree to the evaluation until the material changes
+    if bitbases is not None and depth != DEPTH and (gs.halfmoveClock == 0 or not endgameProgress):
+        score = bitbaseScore(gs, DEPTH - depth)
+        if score is not None:
+            return score if whiteToMove else -score
     if depth == 0:
-        return scoreMaterial(gs.board)
+        score = quiescenceMaterial(gs, -CHECKMATE, CHECKMATE)
+        if endgameProgress:
+            score += progressScore(gs) // 20 #kept well below a pawn of scoreMaterial per step
+        return score if whiteToMove else -score
+    if not validMoves and gs.stalemate: #a mate scores itself below, the loop never raises the starting score
+        return STALEMATE
+    nodeCounts['main'] += 1
+    turnMultiplier = 1 if whiteToMove else -1 #the table keeps scores from the side to move's point of view
+    if depth != DEPTH: #the root still has to pick nextMove
+        entry = minMaxTable.probe(gs.zobristKey)
+        if entry is not None and entry[0] >= depth and entry[2] == EXACT:
+            return turnMultiplier * entry[1]
 
+    bestMoveID = 0
     if whiteToMove:
         maxScore = -CHECKMATE
         for move in validMoves:
             gs.makeMove(move)
-            nextMoves = gs.getValidMoves()
-            score = findMoveMinMax(gs, nextMoves,   depth-1, False)
+            nextMoves = gs.getValidMoves() if depth > 1 else None #the leaves only need quiescenceMaterial
+            score = findMoveMinMax(gs, nextMoves, depth-1, False)
             if score > maxScore:
                 maxScore = score
+                bestMoveID = move.code & 0xffff
                 if depth == DEPTH:
                     nextMove = move
             gs.undoMove(move)
+        minMaxTable.store(gs.zobristKey, depth, turnMultiplier * maxScore, EXACT, bestMoveID)
         return maxScore
     else:
         minScore = CHECKMATE
         for move in validMoves:
             gs.makeMove(move)
-            nextMoves = gs.getValidMoves()
+            nextMoves = gs.getValidMoves() if depth > 1 else None #the leaves only need quiescenceMaterial
             score = findMoveMinMax(gs, nextMoves, depth-1, True)
             if score < minScore:
                 minScore = score
+                bestMoveID = move.code & 0xffff
                 if depth == DEPTH:
                     nextMove = move
             gs.undoMove(move)
+        minMaxTable.store(gs.zobristKey, depth, turnMultiplier * minScore, EXACT, bestMoveID)
         return minScore
 
 
+'''
+Quiescence search for findMoveMinMax, in the pawn units of scoreMaterial and from the side to move's point of view.
+Only captures and promotions that do not lose material by static exchange are played, on top of standing pat with
+GameState.material, which keeps scoreMaterial up to date move by move. Captures that cannot lift the score to alpha
+even with MATERIAL_DELTA_MARGIN on top are skipped, as in Search.quiescence; in check every evasion is searched.
+'''
+def quiescenceMaterial(gs, alpha, beta, ply=0):
+    nodeCounts['quiescence'] += 1
+    inCheck = gs.inCheck()
+    if not inCheck:
+        standPat = gs.material if gs.whiteToMove else -gs.material
+        if standPat >= beta or ply >= MAX_PLY:
+            return standPat
+    moves = []
+    if inCheck:
+        if not gs.generateLegalMoves(moves):
+            return -CHECKMATE
+    elif not gs.generateLegalMoves(moves, CAPTURE_MOVES) and not gs.hasAnyLegalMove():
+        return STALEMATE
+    bestScore = -CHECKMATE
+    if not inCheck:
+        alpha = max(alpha, standPat)
+        bestScore = standPat
+        moves.sort(key=lambda move: PIECE_VALUES[move >> CAPTURED_SHIFT & 15] if move >> CAPTURED_SHIFT != NO_PIECE
+                   else 0, reverse=True)
+    for move in moves:
+        if not inCheck:
+            if (move >> KIND_SHIFT & 15 != PROMOTION
+                    and standPat + PIECE_VALUES[move >> CAPTURED_SHIFT & 15] + MATERIAL_DELTA_MARGIN <= alpha):
+                continue
+            if gs.staticExchange(move) < 0:
+                continue
+        gs.makeMoveCode(move)
+        score = -quiescenceMaterial(gs, -beta, -alpha, ply + 1)
+        gs.undoMoveCode()
+        if score > bestScore:
+            bestScore = score
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+    return bestScore
+
+
+'''
+Orders moves so alpha-beta searches the likely best ones first: the transposition table move, then captures by most
+valuable victim / least valuable attacker, then promotions, then the two killer moves of the ply, then the remaining
+quiet moves by their butterfly history score. Killers and history are learned from the beta cutoffs of the search.
+'''
+class MoveOrderer():
+    HASH_MOVE = 1000000
+    CAPTURE = 100000
+    PROMOTION = 90000
+    KILLERS = (80000, 79000)
+    HISTORY_LIMIT = 50000 #history scores are halved before they can reach the killers
+
+    def __init__(self):
+        self.killers = [[0, 0] for ply in range(MAX_PLY + 1)] #the last two quiet moves that cut off, as 16 bit codes
+        self.history = [[0] * 64 for square in range(64)] #indexed by start and end square
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+
+    '''
+    Scores a packed move code from GameState.generateLegalMoves; hashMove is the 16 bit move from the table
+    '''
+    def scoreMove(self, code, ply, hashMove):
+        move = code & 0xffff
+        if move == hashMove:
+            return self.HASH_MOVE
+        score = 0
+        captured = code >> CAPTURED_SHIFT
+        if captured != NO_PIECE:
+            #a king takes last among equal victims in theory, but a legal king capture is always safe, so its 0 is fine
+            score = self.CAPTURE + 10 * PIECE_VALUES[captured] - PIECE_VALUES[code >> MOVED_SHIFT & 15]
+        if code >> KIND_SHIFT & 15 == PROMOTION:
+            score += self.PROMOTION
+        if score:
+            return score
+        killers = self.killers[ply]
+        if move == killers[0]:
+            return self.KILLERS[0]
+        if move == killers[1]:
+            return self.KILLERS[1]
+        return self.history[code & 63][code >> 6 & 63]
+
+    def orderMoves(self, moves, ply, hashMove=0):
+        moves.sort(key=lambda code: self.scoreMove(code, ply, hashMove), reverse=True)
+        return moves
+
+    '''
+    Called when the move code caused a beta cutoff after moveIndex earlier moves had failed to
+    '''
+    def recordCutoff(self, code, ply, depth, moveIndex):
+        self.cutoffs += 1
+        if moveIndex == 0:
+            self.firstMoveCutoffs += 1
+        if code >> CAPTURED_SHIFT != NO_PIECE or code >> KIND_SHIFT & 15 == PROMOTION:
+            return #captures and promotions are already ordered on their own
+        move = code & 0xffff
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        history = self.history[code & 63]
+        end = code >> 6 & 63
+        history[end] += depth * depth
+        if history[end] > self.HISTORY_LIMIT:
+            for row in self.history:
+                for i in range(64):
+                    row[i] //= 2
+
+    '''
+    Share of cutoffs made by the first move searched, close to 1 means the search is near the minimal tree
+    '''
+    def getStats(self):
+        rate = self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0
+        return {'cutoffs': self.cutoffs, 'firstMoveCutoffs': self.firstMoveCutoffs, 'firstMoveCutoffRate': rate}
+
+
+'''
+Iterative deepening alpha-beta search. Every search keeps its own state on the object, so several can run at once;
+the transposition table is shared between searches unless another one is passed in. Its scores are centipawns, so
+only Search and its subclasses may use it; findMoveMinMax keeps its pawn scores in minMaxTable.
+Depth 1 always completes, after that the search stops when the time or node budget runs out and answers with the
+best move of the deepest iteration it finished.
+Every node the bitbases cover gets their exact score. When the root is covered, its score is the tables' result and
+inside the search they are only probed where a capture or pawn move changed the material, so the search still finds
+the way to the mate on the evaluation instead of stopping one ply in.
+'''
+class Search():
+    def __init__(self, gs, timeLimit=None, nodeLimit=None, maxDepth=MAX_DEPTH, table=None):
+        self.gs = gs
+        self.timeLimit = timeLimit
+        self.nodeLimit = nodeLimit
+        self.maxDepth = maxDepth
+        self.table = table if table is not None else transpositionTable
+        self.nodes = 0 #every node, full width and quiescence
+        self.quiescenceNodes = 0
+        self.stopped = False
+        self.depth = 0 #deepest completed iteration
+        self.bestMove = None
+        self.bestCode = 0 #code of the best move of the deepest finished iteration, can be read while searching
+        self.bestScore = 0
+        self.endgameProgress = False #the root is in the bitbases: leaves score how far the win has got
+        self.orderer = MoveOrderer()
+        self.onIteration = None #called with the search after every finished iteration, e.g. to print progress
+        self.onProgress = None #called with the search every progressInterval seconds while it runs
+        self.progressInterval = 1.0
+        self.nextProgress = 0.0
+        self.iterations = [] #(depth, seconds, nodes, quiescenceNodes) at the end of every finished iteration
+        self.startTime = 0.0
+        self.endTime = None
+        self.tableAtStart = (0, 0) #table probes and hits before the search, for getStats
+        self.countersAtStart = None #instrumentation counters before the search, when they are enabled
+        #one move list per ply, reused by every node at that ply instead of building new lists
+        self.moveBuffers = [[] for ply in range(MAX_PLY + 1)]
+        self.quietBuffers = [[] for ply in range(MAX_PLY + 1)] #the second stage of stagedMoves
+
+    '''
+    Searches the position and returns the Move from validMoves it picked. Inside the search moves are packed codes.
+    '''
+    def run(self, validMoves):
+        self.startTime = time.perf_counter()
+        self.endTime = None
+        self.deadline = self.startTime + self.timeLimit if self.timeLimit is not None else None
+        self.nextProgress = self.startTime + self.progressInterval
+        self.tableAtStart = (self.table.probes, self.table.hits)
+        self.countersAtStart = instrumentation.snapshot() if instrumentation.enabled else None
+        self.table.newSearch()
+        rootMoves = [move.code for move in validMoves]
+        if not rootMoves:
+            return None
+        self.endgameProgress = bitbases is not None and bitbases.probe(self.gs) is not None
+        rootScore = None
+        if self.endgameProgress:
+            rootMoves = keepBitbaseResult(self.gs, rootMoves)
+            rootScore = bitbaseScore(self.gs, 0)
+        entry = self.table.probe(self.gs.zobristKey)
+        self.orderer.orderMoves(rootMoves, 0, entry[3] if entry is not None else 0)
+        for depth in range(1, self.maxDepth + 1):
+            code, score = self.searchRoot(rootMoves, depth)
+            if self.stopped:
+                break
+            if rootScore is not None and abs(score) <= MATE_BOUND:
+                score = rootScore #the search only picks the way, the tables know the result
+            self.bestCode = code
+            self.bestScore = score
+            self.depth = depth
+            self.iterations.append((depth, time.perf_counter() - self.startTime, self.nodes, self.quiescenceNodes))
+            if self.onIteration is not None:
+                self.onIteration(self)
+            #search the best move first in the next iteration
+            rootMoves.remove(code)
+            rootMoves.insert(0, code)
+            if abs(score) > MATE_BOUND:
+                break #a forced mate was found, deeper searches cannot improve on it
+            if self.deadline is not None and time.perf_counter() >= self.deadline:
+                break
+        bestCode = self.bestCode or rootMoves[0]
+        self.bestMove = next(move for move in validMoves if move.code == bestCode)
+        self.endTime = time.perf_counter()
+        return self.bestMove
+
+    '''
+    Statistics of the search as an instrumentation.SearchStats, also while it is still running
+    '''
+    def getStats(self):
+        return instrumentation.SearchStats(self)
+
+    '''
+    Asks the search to stop, safe to call from another thread; run then returns the best move found so far
+    '''
+    def stop(self):
+        self.stopped = True
+
+    '''
+    The expected line of play as move codes: the best root move followed by the table's best moves, as long as they
+    are legal; stops early on a repeated position
+    '''
+    def principalVariation(self, maxLength=MAX_DEPTH):
+        gs = self.gs
+        line = []
+        seen = set()
+        code = self.bestCode
+        while code and len(line) < maxLength and gs.zobristKey not in seen:
+            seen.add(gs.zobristKey)
+            gs.makeMoveCode(code)
+            line.append(code)
+            entry = self.table.probe(gs.zobristKey)
+            code = 0
+            if entry is not None and entry[3]:
+                moves = []
+                gs.generateLegalMoves(moves)
+                code = next((move for move in moves if move & 0xffff == entry[3]), 0)
+        for move in line:
+            gs.undoMoveCode()
+        return line
+
+    def searchRoot(self, rootMoves, depth):
+        gs = self.gs
+        alpha = -CHECKMATE - 1
+        beta = CHECKMATE + 1
+        bestMove = rootMoves[0]
+        for move in rootMoves:
+            gs.makeMoveCode(move)
+            score = -self.negamax(depth - 1, -beta, -alpha, 1)
+            gs.undoMoveCode()
+            if self.stopped:
+                break
+            if score > alpha:
+                alpha = score
+                bestMove = move
+        return bestMove, alpha
+
+    def checkLimits(self):
+        if self.depth == 0:
+            return #the first iteration always finishes so there is a move to play
+        if self.nodeLimit is not None and self.nodes >= self.nodeLimit:
+            self.stopped = True
+        elif self.nodes & 1023 == 0 and (self.deadline is not None or self.onProgress is not None):
+            now = time.perf_counter()
+            if self.deadline is not None and now >= self.deadline:
+                self.stopped = True
+            elif self.onProgress is not None and now >= self.nextProgress:
+                self.nextProgress = now + self.progressInterval
+                self.onProgress(self)
+
+    def negamax(self, depth, alpha, beta, ply):
+        gs = self.gs
+        if ply and gs.halfmoveClock >= 4 and gs.isDraw(1): #fifty moves, or back at a position of the line or game
+            return STALEMATE
+        if depth == 0:
+            return self.quiescence(alpha, beta, ply)
+        self.nodes += 1
+        self.checkLimits()
+        if self.stopped:
+            return 0
+        if bitbases is not None and (gs.halfmoveClock == 0 or not self.endgameProgress):
+            score = bitbaseScore(gs, ply)
+            if score is not None:
+                return score
+
+        key = gs.zobristKey
+        entry = self.table.probe(key)
+        hashMove = 0
+        if entry is not None:
+            hashMove = entry[3]
+            if entry[0] >= depth:
+                score = scoreFromTable(entry[1], ply)
+                bound = entry[2]
+                if bound == EXACT or (bound == LOWER_BOUND and score >= beta) or (bound == UPPER_BOUND and score <= alpha):
+                    return score
+
+        originalAlpha = alpha
+        bestScore = -CHECKMATE - 1
+        bestMove = 0
+        for i, move in enumerate(self.stagedMoves(ply, hashMove)):
+            gs.makeMoveCode(move)
+            score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            gs.undoMoveCode()
+            if self.stopped:
+                return 0
+            if score > bestScore:
+                bestScore = score
+                bestMove = move & 0xffff
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        self.orderer.recordCutoff(move, ply, depth, i)
+                        break
+        if bestScore == -CHECKMATE - 1: #no legal move
+            return -CHECKMATE + ply if gs.inCheck() else STALEMATE
+
+        if bestScore <= originalAlpha:
+            bound = UPPER_BOUND
+        elif bestScore >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.table.store(key, depth, scoreToTable(bestScore, ply), bound, bestMove)
+        return bestScore
+
+
+    '''
+    Yields the legal moves of the node in stages, so a cutoff early on saves generating the rest: the hash move,
+    checked on its own with legalCode, then the captures and promotions best first, then the quiet moves ordered by
+    killers and history. Checks and pins are worked out once for both stages.
+    '''
+    def stagedMoves(self, ply, hashMove):
+        gs = self.gs
+        orderer = self.orderer
+        hashCode = gs.legalCode(hashMove) if hashMove else 0
+        if hashCode:
+            yield hashCode
+        checksAndPins = gs.getChecksAndPins()
+        moves = self.moveBuffers[ply]
+        moves.clear()
+        gs.generateLegalMoves(moves, CAPTURE_MOVES, checksAndPins)
+        orderer.orderMoves(moves, ply)
+        for move in moves:
+            if move != hashCode:
+                yield move
+        moves = self.quietBuffers[ply]
+        moves.clear()
+        gs.generateLegalMoves(moves, QUIET_MOVES, checksAndPins)
+        orderer.orderMoves(moves, ply)
+        for move in moves:
+            if move != hashCode:
+                yield move
+
+    '''
+    The evaluation for the side to move
+    '''
+    def evaluate(self):
+        gs = self.gs
+        score = gs.evaluate() if gs.whiteToMove else -gs.evaluate()
+        if self.endgameProgress:
+            score += progressScore(gs)
+        return score
+
+    '''
+    Searches captures and promotions until the position is quiet, so the evaluation is never taken in the middle of
+    an exchange. The side to move may stand pat on the evaluation instead of capturing; captures that lose material
+    by static exchange, and captures that cannot lift the score to alpha even with DELTA_MARGIN on top, are skipped
+    without being played. In check every evasion is searched, so mates are seen here too.
+    '''
+    def quiescence(self, alpha, beta, ply):
+        gs = self.gs
+        self.nodes += 1
+        self.quiescenceNodes += 1
+        self.checkLimits()
+        if self.stopped:
+            return 0
+        if bitbases is not None and (gs.halfmoveClock == 0 or not self.endgameProgress):
+            score = bitbaseScore(gs, ply)
+            if score is not None:
+                return score
+        inCheck = gs.inCheck()
+        standPat = 0
+        if not inCheck:
+            standPat = self.evaluate()
+            if standPat >= beta or ply >= MAX_PLY:
+                return standPat
+            if standPat + 2 * SEE_VALUES[4] - SEE_VALUES[0] < alpha:
+                return standPat #not even taking a queen while promoting to another gets there
+        moves = self.moveBuffers[ply]
+        moves.clear()
+        if inCheck:
+            if not gs.generateLegalMoves(moves, ALL_MOVES):
+                return -CHECKMATE + ply
+            bestScore = -CHECKMATE + ply
+        else:
+            if not gs.generateLegalMoves(moves, CAPTURE_MOVES):
+                return standPat if gs.hasAnyLegalMove() else STALEMATE
+            alpha = max(alpha, standPat)
+            bestScore = standPat
+        self.orderer.orderMoves(moves, ply)
+
+        for move in moves:
+            if not inCheck:
+                if (move >> KIND_SHIFT & 15 != PROMOTION
+                        and standPat + SEE_VALUES[move >> CAPTURED_SHIFT & 15] + DELTA_MARGIN <= alpha):
+                    continue
+                if gs.staticExchange(move) < 0:
+                    continue
+            gs.makeMoveCode(move)
+            score = -self.quiescence(-beta, -alpha, ply + 1)
+            gs.undoMoveCode()
+            if self.stopped:
+                return 0
+            if score > bestScore:
+                bestScore = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return bestScore
+
+
+#mate scores are stored as distance from the stored position, not from the root
+def scoreToTable(score, ply):
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def scoreFromTable(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+'''
+Opens the opening book at path for bookMove, or closes the current one when path is empty
+'''
+def loadOpeningBook(path):
+    global openingBook
+    if openingBook is not None:
+        openingBook.close()
+    openingBook = OpeningBook(path) if path else None
+    return openingBook
+
+
+'''
+A move from the opening book picked by weight, None when there is no book or the position is not in it
+'''
+def bookMove(gs, validMoves):
+    if openingBook is None:
+        return None
+    return openingBook.pickMove(gs, validMoves)
+
+
+loadOpeningBook(os.environ.get('CHESS_BOOK')) #path of a book built with python -m chess.opening_book build
+
+
+'''
+Exact score for the side to move of a position the bitbases cover, None for the others. Wins are KNOWN_WIN less the
+ply plus winProgress, so the search still heads for the mate the table promises instead of shuffling.
+'''
+def bitbaseScore(gs, ply):
+    result = bitbases.probe(gs)
+    if result == bitbase.DRAW:
+        return STALEMATE
+    if result == bitbase.WIN:
+        return KNOWN_WIN + winProgress(gs) - ply
+    if result == bitbase.LOSS:
+        if gs.gameStatus() == chess_engine.CHECKMATE:
+            return -CHECKMATE + ply
+        return -KNOWN_WIN - winProgress(gs) + ply
+    return None
+
+
+'''
+The root moves that keep the bitbase result of the root, e.g. only winning moves in a won position, so searching
+them on the evaluation can only choose between ways of getting there
+'''
+def keepBitbaseResult(gs, codes):
+    wanted = {bitbase.WIN: (bitbase.LOSS,), bitbase.DRAW: (bitbase.DRAW, bitbase.LOSS)}.get(bitbases.probe(gs))
+    if wanted is None:
+        return codes #lost anyway, let the search find the longest resistance
+    kept = []
+    for code in codes:
+        gs.makeMoveCode(code)
+        result = bitbases.probe(gs)
+        gs.undoMoveCode()
+        if (result or bitbase.DRAW) in wanted: #the piece taken: bare kings
+            kept.append(code)
+    return kept or codes
+
+
+'''
+winProgress for the side to move, 0 outside three piece endings
+'''
+def progressScore(gs):
+    occupied = gs.occupied
+    rest = occupied & (occupied - 1)
+    rest &= rest - 1
+    if not rest or rest & (rest - 1):
+        return 0
+    whiteStronger = gs.colorBitboards[0] & (gs.colorBitboards[0] - 1) != 0
+    return winProgress(gs) if whiteStronger == gs.whiteToMove else -winProgress(gs)
+
+
+'''
+How far the stronger side of a won three piece ending has got: the pawn's advance, or the bare king pushed to the
+edge and the kings close together
+'''
+def winProgress(gs):
+    bitboards = gs.pieceBitboards
+    strong = 0 if gs.colorBitboards[0] & (gs.colorBitboards[0] - 1) else 1
+    pawns = bitboards[6*strong]
+    if pawns:
+        row = (pawns.bit_length() - 1) >> 3
+        return 20 * (6 - row if strong == 0 else row - 1)
+    weakRow, weakCol = divmod(bitboards[6*(1 - strong) + 5].bit_length() - 1, 8)
+    strongRow, strongCol = divmod(bitboards[6*strong + 5].bit_length() - 1, 8)
+    edge = max(3 - weakRow, weakRow - 4) + max(3 - weakCol, weakCol - 4)
+    distance = abs(weakRow - strongRow) + abs(weakCol - strongCol)
+    return 10 * edge + 4 * (14 - distance)
+
+
 def scoreBoard(gs):
     if gs.checkmate:
         if gs.whiteToMove:
@@ -0,0 +1,88 @@
+"""
+Runs the AI search in a background thread so the window keeps drawing and handling events while the AI thinks.
+The search works on a copy of the GameState, and its move comes back through a queue the main loop polls every frame.
+"""
+import copy
+import queue
+import threading
+from chess import ChessAI
+from chess.chess_engine import Move
+
+
+class AIWorker():
+    def __init__(self, timeLimit=ChessAI.TIME_LIMIT):
+        self.timeLimit = timeLimit
+        self.results = queue.Queue()
+        self.search = None #the running search, read by the UI for the thinking indicator
+        self.thread = None
+        self.validMoves = []
+        self.generation = 0 #bumped on every start and cancel, so results of a cancelled search are dropped
+        self.thinking = False
+
+    '''
+    Starts searching a copy of gs; validMoves are the moves of the UI's GameState, the answer is one of them
+    '''
+    def start(self, gs, validMoves):
+        self.cancel()
+        self.generation += 1
+        self.validMoves = validMoves
+        move = ChessAI.bookMove(gs, validMoves)
+        if move is not None: #book moves are answered straight away, poll picks them up next frame
+            self.thinking = True #so the main loop polls instead of starting again and dropping the answer
+            self.results.put((self.generation, move.code))
+            return
+        self.search = ChessAI.Search(copy.deepcopy(gs), self.timeLimit)
+        self.thinking = True
+        self.thread = threading.Thread(target=self.run, args=(self.search, list(validMoves), self.generation),
+                                       daemon=True)
+        self.thread.start()
+
+    def run(self, search, validMoves, generation):
+        move = search.run([Move.fromCode(m.code) for m in validMoves]) #moves of the copy, not shared with the UI
+        self.results.put((generation, move.code if move is not None else None))
+
+    '''
+    Returns the move the search picked once it is done, None while it is still thinking
+    '''
+    def poll(self):
+        while True:
+            try:
+                generation, code = self.results.get_nowait()
+            except queue.Empty:
+                return None
+            if generation != self.generation:
+                continue #left over from a cancelled search
+            self.thinking = False
+            self.search = None
+            for move in self.validMoves:
+                if move.code == code:
+                    return move
+            return ChessAI.findRandomMove(self.validMoves)
+
+    '''
+    Stops the search straight away; whatever it would have answered is ignored
+    '''
+    def cancel(self):
+        if self.search is not None:
+            self.search.stop()
+        self.generation += 1
+        self.thinking = False
+        self.search = None
+
+    '''
+    Cancels and waits for the thread, for when the program exits
+    '''
+    def shutdown(self):
+        self.cancel()
+        if self.thread is not None:
+            self.thread.join(1.0)
+
+    '''
+    Text for the thinking indicator: depth reached, nodes searched and the best move so far
+    '''
+    def status(self):
+        search = self.search
+        if search is None:
+            return ""
+        best = Move.fromCode(search.bestCode).getChessNotation() if search.bestCode else "..."
+        return "Thinking: depth %d, %d nodes, best %s" % (search.depth, search.nodes, best)
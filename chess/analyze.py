@@ -0,0 +1,112 @@
+"""
+Batch analysis of FEN positions: reads one FEN per line from files or stdin and writes one JSON object per position
+to stdout, in input order, with the best move, its score for the side to move, the depth reached and the nodes
+searched (qnodes of them in the quiescence search).
+
+    python -m chess.analyze positions.fen --depth 4 > results.jsonl
+    zcat dump.fen.gz | python -m chess.analyze - --movetime 0.2 -w 8
+
+Input is streamed: only a bounded number of batches is in flight at once, so memory stays flat however long the
+input is. Lines that are not valid FEN, and positions the search fails on, get an "error" field instead of a move.
+"""
+import argparse
+import fileinput
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from chess import chess_engine, ChessAI
+from chess.transposition_table import TranspositionTable
+
+BATCH_SIZE = 16 #positions per task, so the pool is not swamped with tiny messages
+BATCHES_PER_WORKER = 4 #how far reading may run ahead of the workers
+
+_table = None #each worker process keeps one transposition table for all its positions
+
+
+def analyzePosition(fen, timeLimit, nodeLimit, maxDepth, tableMB):
+    global _table
+    if _table is None:
+        _table = TranspositionTable(tableMB)
+    try:
+        gs = chess_engine.GameState.fromFEN(fen)
+    except ValueError as e:
+        return {'fen': fen, 'error': str(e)}
+    try:
+        validMoves = gs.getValidMoves()
+        if not validMoves:
+            return {'fen': fen, 'bestmove': None, 'score': -ChessAI.CHECKMATE if gs.checkmate else ChessAI.STALEMATE,
+                    'depth': 0, 'nodes': 0, 'time': 0.0}
+        search = ChessAI.Search(gs, timeLimit, nodeLimit, maxDepth, _table)
+        start = time.perf_counter()
+        move = search.run(validMoves)
+    except Exception as e: #one position the engine cannot handle must not stop the stream
+        _table.clear() #whatever the broken search stored is not to be trusted
+        return {'fen': fen, 'error': "%s: %s" % (type(e).__name__, e)}
+    return {'fen': fen, 'bestmove': move.getChessNotation(), 'score': search.bestScore, 'depth': search.depth,
+            'nodes': search.nodes, 'qnodes': search.quiescenceNodes, 'time': round(time.perf_counter() - start, 4)}
+
+
+def analyzeBatch(fens, timeLimit, nodeLimit, maxDepth, tableMB):
+    return [analyzePosition(fen, timeLimit, nodeLimit, maxDepth, tableMB) for fen in fens]
+
+
+def readBatches(lines, size=BATCH_SIZE):
+    batch = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        batch.append(line)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+'''
+Analyzes every batch and yields the results in input order. With one worker everything runs in this process.
+'''
+def analyzeStream(batches, workers, timeLimit=None, nodeLimit=None, maxDepth=4, tableMB=16):
+    args = (timeLimit, nodeLimit, maxDepth, tableMB)
+    if workers <= 1:
+        for batch in batches:
+            yield from analyzeBatch(batch, *args)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.submit(analyzeBatch, batch, *args))
+            if len(pending) >= workers * BATCHES_PER_WORKER:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze FEN positions and write the results as JSON lines")
+    parser.add_argument('files', nargs='*', help="files with one FEN per line, - or nothing for stdin")
+    parser.add_argument('-d', '--depth', type=int, help="search depth (default 4 when no other limit is given)")
+    parser.add_argument('--movetime', type=float, help="seconds per position")
+    parser.add_argument('--nodes', type=int, help="nodes per position")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--hash', type=int, default=16, help="transposition table MB per worker")
+    args = parser.parse_args(argv)
+    maxDepth = args.depth or (ChessAI.MAX_DEPTH if args.movetime or args.nodes else 4)
+
+    count = 0
+    start = time.perf_counter()
+    with fileinput.input(args.files or ['-']) as lines:
+        for result in analyzeStream(readBatches(lines), args.workers, args.movetime, args.nodes, maxDepth, args.hash):
+            sys.stdout.write(json.dumps(result) + "\n")
+            count += 1
+    seconds = time.perf_counter() - start
+    sys.stderr.write("%d positions in %.1fs, %.1f positions/s\n" % (count, seconds, count / seconds if seconds else 0))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
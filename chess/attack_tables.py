@@ -0,0 +1,137 @@
+"""
+Attack and ray tables for move generation, worked out once when the module is first imported so the move generators
+only do lookups. Squares are numbered like in chess_engine: square = row*8 + col starting at a8, bit = 1 << square.
+
+Building the tables takes a few milliseconds. Setting the CHESS_TABLE_CACHE environment variable to a file path
+keeps them on disk instead: the first run writes the file and later runs load it.
+"""
+import os
+import pickle
+
+CACHE_VERSION = 1 #bump whenever a table changes so stale cache files are rebuilt
+
+#(row, col) steps in the same order the king moves used to be generated: N, W, S, E, NE, SW, NW, SE
+DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, 1), (1, -1), (-1, -1), (1, 1))
+DIRECTION_INDICES = tuple(range(8))
+ROOK_DIRECTIONS = (0, 1, 2, 3)
+BISHOP_DIRECTIONS = (4, 5, 6, 7)
+#directions along which the square index grows, the first blocker on those rays is the lowest set bit
+POSITIVE_DIRECTIONS = tuple(dr*8 + dc > 0 for dr, dc in DIRECTIONS)
+FULL_BOARD = (1 << 64) - 1
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+
+
+def _leaperAttacks(offsets):
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        mask = 0
+        for dr, dc in offsets:
+            if 0 <= r + dr < 8 and 0 <= c + dc < 8:
+                mask |= 1 << ((r + dr)*8 + c + dc)
+        table.append(mask)
+    return table
+
+
+'''
+For every direction and square, the squares along the ray in the order a slider reaches them
+'''
+def _raySquares():
+    rays = []
+    for dr, dc in DIRECTIONS:
+        table = []
+        for sq in range(64):
+            r, c = divmod(sq, 8)
+            squares = []
+            for i in range(1, 8):
+                if not (0 <= r + dr*i < 8 and 0 <= c + dc*i < 8):
+                    break
+                squares.append((r + dr*i)*8 + c + dc*i)
+            table.append(tuple(squares))
+        rays.append(table)
+    return rays
+
+
+def _rayMasks(raySquares):
+    return [[sum(1 << to for to in squares) for squares in table] for table in raySquares]
+
+
+'''
+BETWEEN[a][b] holds the squares strictly between a and b when they share a line, otherwise 0
+'''
+def _between(raySquares):
+    table = [[0] * 64 for sq in range(64)]
+    for d in DIRECTION_INDICES:
+        for sq in range(64):
+            mask = 0
+            for to in raySquares[d][sq]:
+                table[sq][to] = mask
+                mask |= 1 << to
+    return table
+
+
+def build():
+    raySquares = _raySquares()
+    rays = _rayMasks(raySquares)
+    return {
+        'version': CACHE_VERSION,
+        'knight': _leaperAttacks(KNIGHT_OFFSETS),
+        'king': _leaperAttacks(DIRECTIONS),
+        'pawn': (_leaperAttacks(((-1, -1), (-1, 1))), _leaperAttacks(((1, -1), (1, 1)))),
+        'raySquares': raySquares,
+        'rays': rays,
+        'between': _between(raySquares),
+    }
+
+
+'''
+Loads the tables from cacheFile when it holds the current version, otherwise builds them and tries to write the file.
+A missing, stale or unreadable cache is never an error, the tables are simply rebuilt.
+'''
+def load(cacheFile=None):
+    if cacheFile:
+        try:
+            with open(cacheFile, 'rb') as f:
+                tables = pickle.load(f)
+            if tables.get('version') == CACHE_VERSION:
+                return tables
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            pass
+    tables = build()
+    if cacheFile:
+        try:
+            with open(cacheFile, 'wb') as f:
+                pickle.dump(tables, f, pickle.HIGHEST_PROTOCOL)
+        except OSError:
+            pass
+    return tables
+
+
+_tables = load(os.environ.get('CHESS_TABLE_CACHE'))
+
+KNIGHT_ATTACKS = _tables['knight']
+KING_ATTACKS = _tables['king']
+#squares a pawn of the given colour attacks from each square
+PAWN_ATTACKS = _tables['pawn']
+#RAY_SQUARES[direction][square] is a tuple of squares in order, RAYS[direction][square] the same squares as a bitboard
+RAY_SQUARES = _tables['raySquares']
+RAYS = _tables['rays']
+BETWEEN = _tables['between']
+#every square a rook or bishop could reach from each square on an empty board
+ROOK_RAYS = [RAYS[0][sq] | RAYS[1][sq] | RAYS[2][sq] | RAYS[3][sq] for sq in range(64)]
+BISHOP_RAYS = [RAYS[4][sq] | RAYS[5][sq] | RAYS[6][sq] | RAYS[7][sq] for sq in range(64)]
+
+
+def slidingAttacks(square, occupied, directions):
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][square]
+        blockers = ray & occupied
+        if blockers:
+            if POSITIVE_DIRECTIONS[d]:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= RAYS[d][blocker] #cut the ray off behind the first blocker
+        attacks |= ray
+    return attacks
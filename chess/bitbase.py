@@ -0,0 +1,272 @@
+"""
+Win/draw/loss bitbases for the three piece endings KQK, KRK and KPK. They are built offline by retrograde analysis
+and probed during the search through a memory map, so those endings get exact results instead of deep trees:
+
+    python -m chess.bitbase generate            #writes KQK.bb, KRK.bb and KPK.bb to chess/bitbases
+    python -m chess.bitbase probe "8/8/8/4k3/8/8/3QK3/8 b - - 0 1"
+
+Every table holds two bits per position, for the side to move: 0 for positions that cannot happen, then DRAW, WIN or
+LOSS. Positions are indexed by side to move, white king, black king and the extra piece, with the piece always white;
+positions where black has the piece are looked up with the board mirrored and the colours swapped.
+"""
+import argparse
+import mmap
+import os
+import sys
+import time
+from array import array
+from collections import deque
+from chess import chess_engine
+from chess.chess_engine import PIECE_INDEX, NO_PIECE, PROMOTION, KIND_SHIFT, MOVED_SHIFT, CAPTURED_SHIFT
+from chess.attack_tables import KING_ATTACKS
+
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bitbases")
+TABLES = ("KQK", "KRK", "KPK") #KQK first: KPK positions promote into it
+PIECE_LETTERS = {'Q': PIECE_INDEX['wQ'], 'R': PIECE_INDEX['wR'], 'P': PIECE_INDEX['wP']}
+POSITIONS = 2 * 64 * 64 * 64
+DRAW = 1
+WIN = 2
+LOSS = 3
+RESULT_NAMES = {DRAW: "draw", WIN: "win", LOSS: "loss"}
+_EMPTY_BOARD = [["--"] * 8 for r in range(8)]
+
+
+def positionIndex(blackToMove, whiteKing, blackKing, piece):
+    return blackToMove << 18 | whiteKing << 12 | blackKing << 6 | piece
+
+
+'''
+Two bits per position, four positions to a byte
+'''
+def readValue(data, index):
+    return data[index >> 2] >> ((index & 3) << 1) & 3
+
+
+'''
+Retrograde analysis of one ending, returns the value of every position as a bytearray. Every legal position's moves
+are generated once with GameState; moves that leave the table (captures of the piece, promotions) are resolved
+straight away, the others are inverted into predecessor lists. Then results spread backwards from the mates: a
+position with a move to a lost position is won, a position whose moves all lead to won positions is lost, and
+whatever is left when nothing changes any more is a draw.
+'''
+def generate(letter, tables, onProgress=None):
+    pieceIndex = PIECE_INDEX['w' + letter]
+    whiteKing = PIECE_INDEX['wK']
+    blackKing = PIECE_INDEX['bK']
+    gs = chess_engine.GameState()
+    gs.loadBoard(_EMPTY_BOARD)
+    gs.currentCastlingRight = chess_engine.CastleRights(False, False, False, False)
+    gs.enpassantPossible = ()
+
+    values = bytearray(POSITIONS)
+    legal = bytearray(POSITIONS)
+    remaining = array('i', bytes(4 * POSITIONS)) #moves to positions of this table not yet known to be won
+    escapes = bytearray(POSITIONS) #has a move out of the table that does not lose, so it cannot be lost
+    offsets = array('i', [0]) #successors of position i are successors[offsets[i]:offsets[i + 1]]
+    successors = array('i')
+    queue = deque()
+    moves = []
+    for index in range(POSITIONS):
+        wk = index >> 12 & 63
+        bk = index >> 6 & 63
+        p = index & 63
+        if (wk == bk or wk == p or bk == p or KING_ATTACKS[wk] >> bk & 1
+                or (letter == 'P' and (p < 8 or p >= 56))):
+            offsets.append(len(successors))
+            continue
+        gs.putPiece(whiteKing, wk)
+        gs.putPiece(blackKing, bk)
+        gs.putPiece(pieceIndex, p)
+        gs.whiteToMove = bool(index >> 18) #the side that just moved cannot have been left in check
+        illegal = gs.inCheck()
+        gs.whiteToMove = not gs.whiteToMove
+        if not illegal:
+            legal[index] = 1
+            moves.clear()
+            if not gs.generateLegalMoves(moves):
+                values[index] = LOSS if gs.inCheck() else DRAW
+                if values[index] == LOSS:
+                    queue.append(index)
+            blackToMove = 0 if index >> 18 else 1
+            for code in moves:
+                end = code >> 6 & 63
+                if code >> CAPTURED_SHIFT & 15 != NO_PIECE:
+                    escapes[index] = 1 #the piece is taken, a bare kings draw
+                    continue
+                moved = code >> MOVED_SHIFT & 15
+                if code >> KIND_SHIFT & 15 == PROMOTION:
+                    child = readValue(tables['KQK'], positionIndex(blackToMove, wk, bk, end))
+                    if child == LOSS:
+                        values[index] = WIN
+                    else:
+                        escapes[index] = 1
+                    continue
+                if moved == whiteKing:
+                    successors.append(positionIndex(blackToMove, end, bk, p))
+                elif moved == blackKing:
+                    successors.append(positionIndex(blackToMove, wk, end, p))
+                else:
+                    successors.append(positionIndex(blackToMove, wk, bk, end))
+            remaining[index] = len(successors) - offsets[-1]
+            if values[index] == WIN:
+                queue.append(index)
+        gs.removePiece(p)
+        gs.removePiece(bk)
+        gs.removePiece(wk)
+        offsets.append(len(successors))
+        if onProgress and index & 0xffff == 0xffff:
+            onProgress("K%sK: moves of %d/%d positions" % (letter, index + 1, POSITIONS))
+
+    #predecessor lists, in the same layout as the successor lists
+    counts = array('i', bytes(4 * (POSITIONS + 1)))
+    for child in successors:
+        counts[child + 1] += 1
+    for i in range(POSITIONS):
+        counts[i + 1] += counts[i]
+    predecessorOffsets = array('i', counts)
+    predecessors = array('i', bytes(4 * len(successors)))
+    for parent in range(POSITIONS):
+        for i in range(offsets[parent], offsets[parent + 1]):
+            child = successors[i]
+            predecessors[counts[child]] = parent
+            counts[child] += 1
+    del successors, offsets, counts
+
+    while queue:
+        index = queue.popleft()
+        lost = values[index] == LOSS
+        for i in range(predecessorOffsets[index], predecessorOffsets[index + 1]):
+            parent = predecessors[i]
+            if values[parent]:
+                continue
+            if lost:
+                values[parent] = WIN
+                queue.append(parent)
+            else:
+                remaining[parent] -= 1
+                if remaining[parent] == 0 and not escapes[parent]:
+                    values[parent] = LOSS
+                    queue.append(parent)
+    for index in range(POSITIONS):
+        if legal[index] and not values[index]:
+            values[index] = DRAW
+    return values
+
+
+def pack(values):
+    data = bytearray(len(values) >> 2)
+    for index, value in enumerate(values):
+        data[index >> 2] |= value << ((index & 3) << 1)
+    return data
+
+
+'''
+Generates every table into directory, KQK first so KPK can look up its promotions in it
+'''
+def generateAll(directory=DEFAULT_DIRECTORY, onProgress=None):
+    os.makedirs(directory, exist_ok=True)
+    tables = {}
+    for name in TABLES:
+        start = time.perf_counter()
+        values = generate(name[1], tables, onProgress)
+        tables[name] = pack(values)
+        with open(os.path.join(directory, name + ".bb"), 'wb') as f:
+            f.write(tables[name])
+        if onProgress:
+            onProgress("%s: %d wins, %d draws, %d losses in %.1fs" % (
+                name, values.count(WIN), values.count(DRAW), values.count(LOSS), time.perf_counter() - start))
+    return tables
+
+
+class Bitbases():
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        self.directory = directory
+        self.files = []
+        self.tables = {} #white piece index -> memory-mapped table
+        for name in TABLES:
+            path = os.path.join(directory, name + ".bb")
+            if not os.path.exists(path):
+                continue
+            f = open(path, 'rb')
+            if os.fstat(f.fileno()).st_size != POSITIONS >> 2:
+                f.close()
+                raise ValueError("%s is not a bitbase: wrong size" % path)
+            self.files.append(f)
+            self.tables[PIECE_LETTERS[name[1]]] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        for f in self.files:
+            f.close()
+        self.tables = {}
+        self.files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    '''
+    WIN, DRAW or LOSS for the side to move, or None when the position is not covered by a loaded table
+    '''
+    def probe(self, gs):
+        occupied = gs.occupied
+        rest = occupied & (occupied - 1)
+        rest &= rest - 1
+        if not rest or rest & (rest - 1):
+            return None #not exactly three pieces
+        bitboards = gs.pieceBitboards
+        for index, table in self.tables.items():
+            if bitboards[index]:
+                piece = bitboards[index].bit_length() - 1
+                return readValue(table, positionIndex(0 if gs.whiteToMove else 1, bitboards[5].bit_length() - 1,
+                                                      bitboards[11].bit_length() - 1, piece))
+            if bitboards[index + 6]: #black has the piece: mirror the ranks and swap the colours
+                piece = bitboards[index + 6].bit_length() - 1
+                return readValue(table, positionIndex(1 if gs.whiteToMove else 0, (bitboards[11].bit_length() - 1) ^ 56,
+                                                      (bitboards[5].bit_length() - 1) ^ 56, piece ^ 56))
+        return None
+
+
+'''
+Loads the tables of directory when there are any, None otherwise
+'''
+def load(directory=DEFAULT_DIRECTORY):
+    if not directory or not os.path.isdir(directory):
+        return None
+    bitbases = Bitbases(directory)
+    if not bitbases.tables:
+        return None
+    return bitbases
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate or probe the KQK, KRK and KPK bitbases")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('generate', help="build the tables by retrograde analysis")
+    build.add_argument('-o', '--directory', default=DEFAULT_DIRECTORY)
+    probe = commands.add_parser('probe', help="look a position up")
+    probe.add_argument('fen')
+    probe.add_argument('--directory', default=DEFAULT_DIRECTORY)
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        generateAll(args.directory, lambda text: sys.stderr.write(text + "\n"))
+        return 0
+    bitbases = load(args.directory)
+    if bitbases is None:
+        print("no bitbases in %s, run python -m chess.bitbase generate first" % args.directory)
+        return 1
+    with bitbases:
+        result = bitbases.probe(chess_engine.GameState.fromFEN(args.fen))
+    if result in RESULT_NAMES:
+        print(RESULT_NAMES[result] + " for the side to move")
+    else:
+        print("not covered" if result is None else "not a legal position")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
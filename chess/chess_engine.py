@@ -2,12 +2,93 @@
 This class is responsible for storing all the current state of the chess game, also responsible for determining the valid moves
 at the current state. It will also keep a move log.
 """
+from array import array
+from chess import zobrist
+from chess import piece_square_tables
+from chess.attack_tables import (DIRECTION_INDICES, ROOK_DIRECTIONS, BISHOP_DIRECTIONS, POSITIVE_DIRECTIONS,
+                                 FULL_BOARD, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, RAYS, BETWEEN, ROOK_RAYS,
+                                 BISHOP_RAYS, slidingAttacks)
+
+'''
+The position is kept in bitboards: one 64 bit integer per piece type and colour plus occupancy masks.
+Squares are numbered 0..63 row by row starting at a8, so square = row*8 + col and its bit is 1 << square.
+'''
+PIECES = ('wP', 'wN', 'wB', 'wR', 'wQ', 'wK', 'bP', 'bN', 'bB', 'bR', 'bQ', 'bK')
+PIECE_INDEX = {piece: i for i, piece in enumerate(PIECES)}
+NO_PIECE = len(PIECES) #index of an empty square
+PIECE_NAMES = PIECES + ("--",)
+WHITE = 0
+BLACK = 1
+
+'''
+Moves are packed into ints on the hot path: bits 0-5 start square, 6-11 end square, 12-15 kind of move,
+16-19 index of the moved piece and 20-23 index of the captured piece (NO_PIECE when nothing is captured).
+The low 16 bits alone identify the move within a position and are what the transposition table keeps.
+'''
+NORMAL = 0
+DOUBLE_PUSH = 1
+CASTLE = 2
+EN_PASSANT = 3
+PROMOTION = 4 #always to a queen
+KIND_SHIFT = 12
+MOVED_SHIFT = 16
+CAPTURED_SHIFT = 20
+NO_CAPTURE = NO_PIECE << CAPTURED_SHIFT
+
+#evaluation terms of every piece on every square, see piece_square_tables
+MIDDLEGAME_SCORES = piece_square_tables.buildScores(piece_square_tables.MIDDLEGAME_VALUES,
+                                                    piece_square_tables.middlegameTables, PIECES)
+ENDGAME_SCORES = piece_square_tables.buildScores(piece_square_tables.ENDGAME_VALUES,
+                                                 piece_square_tables.endgameTables, PIECES)
+PHASES = [piece_square_tables.PHASE_WEIGHTS[piece[1]] for piece in PIECES]
+#plain material in pawns, white positive, for the legacy searches of ChessAI that score in its pieceScore units
+MATERIAL = [{'P': 1, 'N': 3, 'B': 3, 'R': 5, 'Q': 9, 'K': 0}[piece[1]] * (1 if piece[0] == 'w' else -1)
+            for piece in PIECES]
+MAX_PHASE = piece_square_tables.MAX_PHASE
+#piece values for static exchange evaluation, indexed by piece index; kings are worth more than anything they can win
+SEE_VALUES = [piece_square_tables.MIDDLEGAME_VALUES[piece[1]] if piece[1] != 'K' else 20000 for piece in PIECES] + [0]
+#castling rights as bits, laid out the way the zobrist castle keys are indexed
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+#the castling bits a move from or to each square keeps: moving a king or rook from home, or taking the rook there,
+#clears its rights
+CASTLING_MASKS = [15] * 64
+CASTLING_MASKS[60] = BLACK_KINGSIDE | BLACK_QUEENSIDE
+CASTLING_MASKS[4] = WHITE_KINGSIDE | WHITE_QUEENSIDE
+CASTLING_MASKS[63] = 15 ^ WHITE_KINGSIDE
+CASTLING_MASKS[56] = 15 ^ WHITE_QUEENSIDE
+CASTLING_MASKS[7] = 15 ^ BLACK_KINGSIDE
+CASTLING_MASKS[0] = 15 ^ BLACK_QUEENSIDE
+#every move leaves two entries on GameState.undoStack: the move code packed with the state the move cannot be undone
+#from, then the zobrist key from before the move
+CASTLING_SHIFT = 24 #the move code takes the 24 bits below
+ENPASSANT_SHIFT = 28 #the en passant square, NO_SQUARE when there is none
+CLOCK_SHIFT = 35 #the halfmove clock
+NO_SQUARE = 127
+#move generation stages, so the search can look at captures before any quiet move is generated
+CAPTURE_MOVES = 1 #captures, en passant and promotions
+QUIET_MOVES = 2 #every other move, castling included
+ALL_MOVES = CAPTURE_MOVES | QUIET_MOVES
+#gameStatus results
+ONGOING = 0
+CHECKMATE = 1
+STALEMATE = 2
+FIFTY_MOVES = 3 #a hundred plies without a capture or pawn move
+REPETITION = 4 #the same position a third time
+
 
 class GameState():
+    #when True every makeMove/undoMove checks the incremental zobrist key against a full recompute
+    debugZobrist = False
+    #same for the incrementally kept evaluation
+    debugEvaluation = False
+
     def __init__(self):
 
         # an 8*8 two dimensional list
-        self.board = [
+        board = [
             ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
             ["bP", "bP", "bP", "bP", "bP", "bP", "bP", "bP"],
             ["--", "--", "--", "--", "--", "--", "--", "--"],
@@ -21,290 +102,947 @@ class GameState():
                              'Q': self.getQueenMoves, 'K': self.getKingMoves}
         self.whiteToMove = True
         self.moveLog = []
-        self.whiteKingLocation = (7,4)
-        self.blackKingLocation = (0,4)
-        self.checkmate = False
-        self.stalemate = False
-        self.enpassantPossible = () #square where the enpassant capture is possible
-        self.currentCastlingRight = CastleRights(True, True, True, True)
-        self.castleRightLog = [CastleRights(self.currentCastlingRight.wks,self.currentCastlingRight.bks,
-                                            self.currentCastlingRight.wqs, self.currentCastlingRight.bqs )]
+        self._status = None #gameStatus of the position, None until somebody asks
+        self.epSquare = -1 #square where the enpassant capture is possible, -1 when there is none
+        self.castling = 15 #castling bits, WHITE_KINGSIDE and the others
+        self.undoStack = array('Q') #two entries per move played, UI and search alike, see CASTLING_SHIFT
+        self.halfmoveClock = 0 #plies since the last capture or pawn move, for the fifty move rule
+        self.fullmoveNumber = 1 #starts at 1 and goes up after every black move
+        self.loadBoard(board)
 
     '''
-    Takes a move as a parameter and executes it. (Will not work for castling and en-pessant and pawn promotion)
+    Builds the position of a FEN string
     '''
-    def makeMove(self,move):
-        self.board[move.startRow][move.startCol] = "--"
-        self.board[move.endRow][move.endCol]= move.pieceMoved
-        self.moveLog.append(move) #log the move so we can undo it later
-        self.whiteToMove = not self.whiteToMove #switch turn
-        #update the king's location if moved
-        if move.pieceMoved == 'wK':
-            self.whiteKingLocation = (move.endRow, move.endCol)
-        elif move.pieceMoved == 'bK':
-            self.blackKingLocation = (move.endRow, move.endCol)
-        #Pawn Promotion
-        if move.isPawnPromotion:
-            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + 'Q'
+    @classmethod
+    def fromFEN(cls, fen):
+        gs = cls()
+        gs.setFEN(fen)
+        return gs
 
-        #Enpassant move
-        if move.isenpassantMove:
-            self.board[move.startRow][move.endCol] = '--' #Capturing the pawn
+    '''
+    Sets up the position of a FEN string: pieces, side to move, castling rights, en passant square and both clocks.
+    The clocks may be left out. Castling rights whose king or rook is not on its home square are dropped. Raises
+    ValueError on a malformed FEN, and on a position that cannot arise in a game: one without exactly one king a side,
+    with a pawn on the first or last rank, an en passant square on the wrong side's rank, or with the side that just
+    moved left in check, where the king could be taken. Only that last check needs the position set up, so after it
+    fails the GameState is left in that position.
+    '''
+    def setFEN(self, fen):
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError("FEN needs at least 4 fields: %r" % fen)
+        ranks = fields[0].split('/')
+        if len(ranks) != 8:
+            raise ValueError("FEN board needs 8 ranks: %r" % fen)
+        board = []
+        for rank in ranks:
+            row = []
+            for ch in rank:
+                if ch.isdigit():
+                    row += ["--"] * int(ch)
+                elif ch.upper() in "PNBRQK":
+                    row.append(('w' if ch.isupper() else 'b') + ch.upper())
+                else:
+                    raise ValueError("bad piece %r in FEN %r" % (ch, fen))
+            if len(row) != 8:
+                raise ValueError("FEN rank %r does not have 8 squares" % rank)
+            board.append(row)
+        if sum(row.count('wK') for row in board) != 1 or sum(row.count('bK') for row in board) != 1:
+            raise ValueError("FEN needs one king of each colour: %r" % fen)
+        if any(piece[1] == 'P' for piece in board[0] + board[7]):
+            raise ValueError("pawn on the first or last rank in FEN %r" % fen)
+        if fields[1] not in ('w', 'b'):
+            raise ValueError("bad side to move in FEN %r" % fen)
+        castling = fields[2]
+        if castling != '-' and (not set(castling) <= set("KQkq") or len(set(castling)) != len(castling)):
+            raise ValueError("bad castling rights in FEN %r" % fen)
+        enpassant = fields[3]
+        if enpassant != '-' and (len(enpassant) != 2 or enpassant[0] not in Move.filesToCols
+                                 or enpassant[1] != ('6' if fields[1] == 'w' else '3')):
+            raise ValueError("bad en passant square in FEN %r" % fen)
+        try:
+            halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+            fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError("bad move clocks in FEN %r" % fen)
+        if halfmoveClock < 0 or fullmoveNumber < 0:
+            raise ValueError("negative move clock in FEN %r" % fen)
+        #a right is only kept while its king and rook are still at home, the generator relies on both being there
+        for letter, row, rookCol in (('K', 7, 7), ('Q', 7, 0), ('k', 0, 7), ('q', 0, 0)):
+            colour = 'w' if letter.isupper() else 'b'
+            if board[row][4] != colour + 'K' or board[row][rookCol] != colour + 'R':
+                castling = castling.replace(letter, '')
+
+        self.whiteToMove = fields[1] == 'w'
+        self.moveLog = []
+        self._status = None
+        self.epSquare = Move.ranksToRows[enpassant[1]]*8 + Move.filesToCols[enpassant[0]] if enpassant != '-' else -1
+        self.castling = ((WHITE_KINGSIDE if 'K' in castling else 0) | (WHITE_QUEENSIDE if 'Q' in castling else 0)
+                         | (BLACK_KINGSIDE if 'k' in castling else 0) | (BLACK_QUEENSIDE if 'q' in castling else 0))
+        self.undoStack = array('Q')
+        self.halfmoveClock = halfmoveClock
+        self.fullmoveNumber = fullmoveNumber
+        self.loadBoard(board) #last, so the zobrist key covers the side, castling and en passant set above
+        them = BLACK if self.whiteToMove else WHITE
+        if self.isSquareAttacked(self.pieceBitboards[6*them + 5].bit_length() - 1, 1 - them):
+            raise ValueError("the side not to move is in check in FEN %r" % fen)
+
+    '''
+    The position as a FEN string
+    '''
+    def getFEN(self):
+        ranks = []
+        for r in range(8):
+            rank = ""
+            empty = 0
+            for c in range(8):
+                index = self.squares[r*8 + c]
+                if index == NO_PIECE:
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                piece = PIECES[index]
+                rank += piece[1] if piece[0] == 'w' else piece[1].lower()
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        castling = "".join(letter for bit, letter in zip((WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE),
+                                                         "KQkq") if self.castling & bit)
+        enpassant = '-'
+        if self.epSquare >= 0:
+            enpassant = Move.colsToFiles[self.epSquare & 7] + Move.rowsToRanks[self.epSquare >> 3]
+        return "%s %s %s %s %d %d" % ("/".join(ranks), 'w' if self.whiteToMove else 'b', castling or '-', enpassant,
+                                      self.halfmoveClock, self.fullmoveNumber)
+
+    '''
+    Replaces the pieces with the ones on an 8*8 board of two character strings
+    '''
+    def loadBoard(self, board):
+        self.zobristKey = 0
+        #material plus piece-square scores, white positive, updated by every putPiece/removePiece
+        self.middlegameScore = 0
+        self.endgameScore = 0
+        self.phase = 0
+        self.material = 0 #MATERIAL of every piece on the board
+        self.pieceBitboards = [0] * len(PIECES) #one bitboard per piece type and colour
+        self.colorBitboards = [0, 0] #all white pieces, all black pieces
+        self.occupied = 0
+        self.squares = [NO_PIECE] * 64 #index of the piece on each square, for cheap lookups by square
+        for r in range(8):
+            for c in range(8):
+                piece = board[r][c]
+                if piece != "--":
+                    self.putPiece(PIECE_INDEX[piece], r*8 + c)
+        self._boardView = None
+        self._status = None
+        self.zobristKey = self.computeZobristKey()
+
+    def putPiece(self, index, square):
+        bit = 1 << square
+        self.pieceBitboards[index] |= bit
+        self.zobristKey ^= zobrist.PIECE_KEYS[index][square]
+        self.middlegameScore += MIDDLEGAME_SCORES[index][square]
+        self.endgameScore += ENDGAME_SCORES[index][square]
+        self.phase += PHASES[index]
+        self.material += MATERIAL[index]
+        self.colorBitboards[index >= 6] |= bit
+        self.occupied |= bit
+        self.squares[square] = index
+
+    def removePiece(self, square):
+        index = self.squares[square]
+        mask = ~(1 << square)
+        self.pieceBitboards[index] &= mask
+        self.zobristKey ^= zobrist.PIECE_KEYS[index][square]
+        self.middlegameScore -= MIDDLEGAME_SCORES[index][square]
+        self.endgameScore -= ENDGAME_SCORES[index][square]
+        self.phase -= PHASES[index]
+        self.material -= MATERIAL[index]
+        self.colorBitboards[index >= 6] &= mask
+        self.occupied &= mask
+        self.squares[square] = NO_PIECE
+        return index
+
+    '''
+    The old 8*8 list of strings, only built when somebody asks for it (drawing, old callers)
+    '''
+    @property
+    def board(self):
+        if self._boardView is None:
+            names = [PIECE_NAMES[index] for index in self.squares]
+            self._boardView = [names[r*8:r*8 + 8] for r in range(8)]
+        return self._boardView
+
+    @board.setter
+    def board(self, board):
+        self.loadBoard(board)
+
+    '''
+    The en passant square as (row, col), () when there is none. Setting it keeps the zobrist key in step.
+    '''
+    @property
+    def enpassantPossible(self):
+        return divmod(self.epSquare, 8) if self.epSquare >= 0 else ()
+
+    @enpassantPossible.setter
+    def enpassantPossible(self, square):
+        self.zobristKey ^= self.enpassantKey()
+        self.epSquare = square[0]*8 + square[1] if square else -1
+        self.zobristKey ^= self.enpassantKey()
+        self._status = None
+
+    '''
+    A CastleRights copy of the castling bits, for callers that want them by name; changing the copy changes nothing,
+    assigning a CastleRights sets the rights and keeps the zobrist key in step
+    '''
+    @property
+    def currentCastlingRight(self):
+        castling = self.castling
+        return CastleRights(bool(castling & WHITE_KINGSIDE), bool(castling & BLACK_KINGSIDE),
+                            bool(castling & WHITE_QUEENSIDE), bool(castling & BLACK_QUEENSIDE))
+
+    @currentCastlingRight.setter
+    def currentCastlingRight(self, rights):
+        self.zobristKey ^= zobrist.CASTLE_KEYS[self.castling]
+        self.castling = (rights.wks * WHITE_KINGSIDE | rights.wqs * WHITE_QUEENSIDE | rights.bks * BLACK_KINGSIDE
+                         | rights.bqs * BLACK_QUEENSIDE)
+        self.zobristKey ^= zobrist.CASTLE_KEYS[self.castling]
+        self._status = None
+
+    '''
+    The packed codes of every move played, oldest first
+    '''
+    @property
+    def moveStack(self):
+        return [state & 0xffffff for state in self.undoStack[::2]]
 
+    @property
+    def whiteKingLocation(self):
+        return divmod(self.pieceBitboards[PIECE_INDEX['wK']].bit_length() - 1, 8)
 
+    @property
+    def blackKingLocation(self):
+        return divmod(self.pieceBitboards[PIECE_INDEX['bK']].bit_length() - 1, 8)
 
+    '''
+    Takes a move as a parameter and executes it.
+    '''
+    def makeMove(self,move):
+        self.moveLog.append(move) #log the move so we can undo it later
+        self.makeMoveCode(move.code)
+
+    '''
+    Plays a packed move, the search uses this directly so no Move objects are needed
+    '''
+    def makeMoveCode(self, code):
+        start = code & 63
+        end = code >> 6 & 63
+        kind = code >> KIND_SHIFT & 15
+        moved = code >> MOVED_SHIFT & 15
+        self.undoStack.append(code | self.castling << CASTLING_SHIFT | (self.epSquare & NO_SQUARE) << ENPASSANT_SHIFT
+                              | self.halfmoveClock << CLOCK_SHIFT)
+        self.undoStack.append(self.zobristKey)
+        if moved % 6 == 0 or code >> CAPTURED_SHIFT != NO_PIECE: #pawn move or capture
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        if moved >= 6: #black moved
+            self.fullmoveNumber += 1
+        self.zobristKey ^= zobrist.SIDE_KEY ^ self.enpassantKey() ^ zobrist.CASTLE_KEYS[self.castling]
+
+        #Enpassant move
+        if kind == EN_PASSANT:
+            self.removePiece((start & 56) | (end & 7)) #Capturing the pawn, beside the start square
+        elif code >> CAPTURED_SHIFT != NO_PIECE:
+            self.removePiece(end)
+        self.removePiece(start)
+        #Pawn Promotion
+        if kind == PROMOTION:
+            self.putPiece(moved + 4, end) #the queen of the same colour
+        else:
+            self.putPiece(moved, end)
+        self.whiteToMove = not self.whiteToMove #switch turn
 
         #update the enpassantpossible variable
-        if move.pieceMoved[1] == 'P' and abs(move.startRow-move.endRow) == 2: #2 square pawn advances
-            self.enpassantPossible = ((move.startRow + move.endRow)//2, move.startCol)
+        if kind == DOUBLE_PUSH: #2 square pawn advances
+            self.epSquare = (start + end) >> 1
         else:
-            self.enpassantPossible = ()
+            self.epSquare = -1
 
         #castle Move
-        if move.isCastleMove:
-            if move.endCol-move.startCol == 2 : # a king side castle
-                self.board[move.endRow][move.endCol-1] = self.board[move.endRow][move.endCol+1] #copies the rook
-                self.board[move.endRow][move.endCol+1] = '--'
-
+        if kind == CASTLE:
+            if end > start: # a king side castle
+                self.moveRook(end + 1, end - 1)
             else: #queenside castle
-                self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-2] #copies the rook
-                self.board[move.endRow][move.endCol-2] = '--'
+                self.moveRook(end - 2, end + 1)
 
         #update Castling Rights - whenever a rook or a king moves
-        self.updateCastleRights(move)
-        self.castleRightLog.append(CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks,
-                                            self.currentCastlingRight.wqs, self.currentCastlingRight.bqs))
+        self.castling &= CASTLING_MASKS[start] & CASTLING_MASKS[end]
+        self.zobristKey ^= self.enpassantKey() ^ zobrist.CASTLE_KEYS[self.castling]
+        self._status = None
+        self._boardView = None
+        if self.debugZobrist:
+            self.checkZobristKey("makeMove " + Move.fromCode(code).getChessNotation())
+        if self.debugEvaluation:
+            self.checkEvaluation("makeMove " + Move.fromCode(code).getChessNotation())
+
+    def moveRook(self, fromSquare, toSquare):
+        if self.squares[fromSquare] != NO_PIECE:
+            self.putPiece(self.removePiece(fromSquare), toSquare)
+
     '''
     Undoes the last move'''
     def undoMove(self, move):
         if len(self.moveLog) != 0:
-            move = self.moveLog.pop()
-            self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
-            self.whiteToMove = not self.whiteToMove #switches turn again
-            #update King's position
-            if move.pieceMoved == 'wK':
-                self.whiteKingLocation = (move.startRow, move.startCol)
-            elif move.pieceMoved == 'bK':
-                self.blackKingLocation = (move.startRow, move.startCol)
-            #undo the enpassant move
-            if move.isenpassantMove:
-                self.board[move.endRow][move.endCol] = '--' #leave landing square blank
-                self.board[move.startRow][move.endCol] = move.pieceCaptured
-                self.enpassantPossible = (move.endRow, move.endCol)
-            #undo 2 squre pawn advance
-            if move.pieceMoved[1] == 'P' and abs(move.startRow - move.endRow) == 2:
-                self.enpassantPossible = ()
-
-            #undo the castling rights
-            self.castleRightLog.pop()
-            self.currentCastlingRight = self.castleRightLog[-1]
-
-
-            #undo the castle move
-            if move.isCastleMove:
-                if move.endCol - move.startCol == 2: #kingside castle
-                    self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-1]
-                    self.board[move.endRow][move.endCol-1] = '--'
-                else:
-                    self.board[move.endRow][move.endCol-2] = self.board[move.endRow][move.endCol+1]
-                    self.board[move.endRow][move.endCol+1] = '--'
-
-            self.checkmate = False
-            self.stalemate = False
-    #update the castle right given the move
-    def updateCastleRights(self, move):
-        if move.pieceMoved == 'wK':
-            self.currentCastlingRight.wks = False
-            self.currentCastlingRight.wqs = False
-        elif move.pieceMoved == 'bK':
-            self.currentCastlingRight.bks = False
-            self.currentCastlingRight.bqs = False
-        elif move.pieceMoved == 'wR':
-            if move.startRow == 7:
-                if move.startCol == 0:
-                    self.currentCastlingRight.wqs = False
-                elif move.startCol == 7:
-                    self.currentCastlingRight.wks = False
-        elif move.pieceMoved == 'bR':
-            if move.startRow == 0:
-                if move.startCol == 0:
-                    self.currentCastlingRight.bqs = False
-                elif move.startCol == 7:
-                    self.currentCastlingRight.bks = False
+            self.moveLog.pop()
+            self.undoMoveCode()
 
+    '''
+    Takes back the last move played with makeMove or makeMoveCode
+    '''
+    def undoMoveCode(self):
+        key = self.undoStack.pop()
+        state = self.undoStack.pop()
+        code = state & 0xffffff
+        start = code & 63
+        end = code >> 6 & 63
+        kind = code >> KIND_SHIFT & 15
+        captured = code >> CAPTURED_SHIFT
+        self.removePiece(end)
+        self.putPiece(code >> MOVED_SHIFT & 15, start)
+        self.whiteToMove = not self.whiteToMove #switches turn again
+        #undo the enpassant move
+        if kind == EN_PASSANT:
+            self.putPiece(captured, (start & 56) | (end & 7))
+        elif captured != NO_PIECE:
+            self.putPiece(captured, end)
+        epSquare = state >> ENPASSANT_SHIFT & NO_SQUARE
+        self.epSquare = epSquare if epSquare != NO_SQUARE else -1
+        self.halfmoveClock = state >> CLOCK_SHIFT
+        self.castling = state >> CASTLING_SHIFT & 15
+        if code >> MOVED_SHIFT & 15 >= 6:
+            self.fullmoveNumber -= 1
+
+        #undo the castle move
+        if kind == CASTLE:
+            if end > start: #kingside castle
+                self.moveRook(end - 1, end + 1)
+            else:
+                self.moveRook(end + 1, end - 2)
+
+        self._status = None
+        self._boardView = None
+        self.zobristKey = key
+        if self.debugZobrist:
+            self.checkZobristKey("undoMove " + Move.fromCode(code).getChessNotation())
+        if self.debugEvaluation:
+            self.checkEvaluation("undoMove " + Move.fromCode(code).getChessNotation())
+
+    #key for the en passant file, only when a pawn of the side to move can really capture there
+    def enpassantKey(self):
+        if self.epSquare < 0:
+            return 0
+        us = WHITE if self.whiteToMove else BLACK
+        if PAWN_ATTACKS[1 - us][self.epSquare] & self.pieceBitboards[6 * us]:
+            return zobrist.EN_PASSANT_KEYS[self.epSquare & 7]
+        return 0
 
+    '''
+    Builds the zobrist key from scratch. Needed whenever the state is set by hand instead of through makeMove.
+    '''
+    def computeZobristKey(self):
+        key = 0
+        for index, bb in enumerate(self.pieceBitboards):
+            while bb:
+                bit = bb & -bb
+                bb ^= bit
+                key ^= zobrist.PIECE_KEYS[index][bit.bit_length() - 1]
+        if not self.whiteToMove:
+            key ^= zobrist.SIDE_KEY
+        return key ^ zobrist.CASTLE_KEYS[self.castling] ^ self.enpassantKey()
+
+    def checkZobristKey(self, where):
+        expected = self.computeZobristKey()
+        if self.zobristKey != expected:
+            raise RuntimeError("zobrist key out of sync after %s: %016x, expected %016x" % (where, self.zobristKey, expected))
 
+    '''
+    Static evaluation in centipawns from white's point of view: the kept middlegame and endgame scores blended by
+    how much material is left. Constant time, nothing is scanned.
+    '''
+    def evaluate(self):
+        phase = self.phase if self.phase < MAX_PHASE else MAX_PHASE
+        return (self.middlegameScore * phase + self.endgameScore * (MAX_PHASE - phase)) // MAX_PHASE
+
+    '''
+    Recomputes (middlegameScore, endgameScore, phase, material) from the pieces on the board
+    '''
+    def computeEvaluation(self):
+        middlegame = endgame = phase = material = 0
+        for square, index in enumerate(self.squares):
+            if index != NO_PIECE:
+                middlegame += MIDDLEGAME_SCORES[index][square]
+                endgame += ENDGAME_SCORES[index][square]
+                phase += PHASES[index]
+                material += MATERIAL[index]
+        return middlegame, endgame, phase, material
+
+    def checkEvaluation(self, where):
+        expected = self.computeEvaluation()
+        kept = (self.middlegameScore, self.endgameScore, self.phase, self.material)
+        if kept != expected:
+            raise RuntimeError("evaluation out of sync after %s: %s, expected %s" % (where, kept, expected))
 
     '''
     All moves considering the king is in check
     '''
     def getValidMoves(self):
-        tempEnpassantPossible = self.enpassantPossible
-        tempCastleRight = CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks,
-                                       self.currentCastlingRight.wqs, self.currentCastlingRight.bqs) #copy the current castling right
-        moves = self.getAllPossibleMoves()
-        if self.whiteToMove:
-            self.getCastleMoves(self.whiteKingLocation[0], self.whiteKingLocation[1], moves)
-        else:
-            self.getCastleMoves(self.blackKingLocation[0], self.blackKingLocation[1], moves)
-        for i in range(len(moves)-1, -1, -1): #When removing go backwards through the list
-            self.makeMove(moves[i])
-            self.whiteToMove = not self.whiteToMove
-            if self.inCheck():
-                moves.remove(moves[i])
-            self.whiteToMove = not self.whiteToMove
-            self.undoMove(moves)
+        moves = self.getLegalMoves()
         if len(moves) == 0:
-            if self.inCheck():
-                self.checkmate = True
+            self._status = CHECKMATE if self.inCheck() else STALEMATE
+        return moves
+
+    '''
+    ONGOING, CHECKMATE, STALEMATE, FIFTY_MOVES or REPETITION for the side to move; a mate on the hundredth ply still
+    counts as a mate. Worked out with hasAnyLegalMove the first time it is asked for and kept until the position
+    changes; getValidMoves fills in mates and stalemates for free.
+    '''
+    def gameStatus(self):
+        if self._status is None:
+            if self.hasAnyLegalMove():
+                self._status = self.drawStatus()
             else:
-                self.stalemate = False
+                self._status = CHECKMATE if self.inCheck() else STALEMATE
+        return self._status
+
+    #FIFTY_MOVES or REPETITION when the game is drawn by rule, else ONGOING; does not look for mates
+    def drawStatus(self):
+        if self.halfmoveClock >= 100:
+            return FIFTY_MOVES
+        if self.repetitions(2) >= 2:
+            return REPETITION
+        return ONGOING
+
+    '''
+    How many times the position was on the board before, counting up to limit. Only the keys of the plies since the
+    last capture or pawn move are compared, every second one so the side to move is the same.
+    '''
+    def repetitions(self, limit=2):
+        clock = self.halfmoveClock
+        if clock < 4:
+            return 0 #going away and coming back takes two moves each
+        key = self.zobristKey
+        stack = self.undoStack
+        found = 0
+        #the key before the n-th move from the end is at len(stack) - 2n + 1
+        last = len(stack) - 3
+        first = max(len(stack) - 2 * clock + 1, 1)
+        for i in range(last, first - 1, -4):
+            if stack[i] == key:
+                found += 1
+                if found >= limit:
+                    break
+        return found
+
+    '''
+    Drawn by the fifty move rule, or by repetition: the game needs the position a third time (repeats=2), but a search
+    can score a line drawn as soon as it comes back once (repeats=1), whatever was best then is best again
+    '''
+    def isDraw(self, repeats=2):
+        if self.halfmoveClock < 4:
+            return False
+        if self.halfmoveClock >= 100:
+            return self.hasAnyLegalMove() or not self.inCheck()
+        return self.repetitions(repeats) >= repeats
+
+    @property
+    def checkmate(self):
+        return self.gameStatus() == CHECKMATE
+
+    @property
+    def stalemate(self):
+        return self.gameStatus() == STALEMATE
+
+    '''
+    Whether the side to move has any legal move, without building the move list: it stops at the first king step to
+    a safe square or piece that has a square to go to. Castling needs no look of its own, a legal castle means the
+    king could also just step towards the rook. Only en passant, when it is on, goes through generateLegalMoves.
+    '''
+    def hasAnyLegalMove(self):
+        us = WHITE if self.whiteToMove else BLACK
+        them = 1 - us
+        bitboards = self.pieceBitboards
+        ours = 6 * us
+        own = self.colorBitboards[us]
+        occupied = self.occupied
+        kingBit = bitboards[ours + 5]
+        kingSquare = kingBit.bit_length() - 1
+        checksAndPins = self.getChecksAndPins()
+        checkers, checkMask, pins = checksAndPins
+
+        withoutKing = occupied ^ kingBit
+        targets = KING_ATTACKS[kingSquare] & ~own
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            if not self.isSquareAttacked(bit.bit_length() - 1, them, withoutKing):
+                return True
+        if checkers & (checkers - 1):
+            return False #double check and the king is stuck
+        target = (checkMask if checkers else FULL_BOARD) & ~own
+
+        for pieceIndex in (1, 2, 3, 4):
+            bb = bitboards[ours + pieceIndex]
+            while bb:
+                bit = bb & -bb
+                bb ^= bit
+                square = bit.bit_length() - 1
+                if pieceIndex == 1:
+                    targets = KNIGHT_ATTACKS[square]
+                elif pieceIndex == 2:
+                    targets = slidingAttacks(square, occupied, BISHOP_DIRECTIONS)
+                elif pieceIndex == 3:
+                    targets = slidingAttacks(square, occupied, ROOK_DIRECTIONS)
+                else:
+                    targets = slidingAttacks(square, occupied, DIRECTION_INDICES)
+                targets &= target
+                if square in pins:
+                    targets &= pins[square]
+                if targets:
+                    return True
+
+        step = -8 if us == WHITE else 8
+        homeRow = 6 if us == WHITE else 1
+        enemies = self.colorBitboards[them]
+        bb = bitboards[ours]
+        while bb:
+            bit = bb & -bb
+            bb ^= bit
+            square = bit.bit_length() - 1
+            allowed = target & pins[square] if square in pins else target
+            to = square + step
+            if not occupied >> to & 1:
+                if allowed >> to & 1:
+                    return True
+                to += step
+                if square >> 3 == homeRow and not occupied >> to & 1 and allowed >> to & 1:
+                    return True
+            if PAWN_ATTACKS[us][square] & enemies & allowed:
+                return True
+        if self.epSquare >= 0:
+            return self.generateLegalMoves([], CAPTURE_MOVES, checksAndPins) > 0
+        return False
+
+    '''
+    Finds the pieces giving check and the pinned pieces of the side to move in one scan outward from its king.
+    Returns the checkers, the squares that stop a single check (the checker plus the squares in between) and a
+    dict from each pinned piece's square to the squares it may still move to along its pin.
+    '''
+    def getChecksAndPins(self):
+        us = WHITE if self.whiteToMove else BLACK
+        them = 1 - us
+        bitboards = self.pieceBitboards
+        theirs = 6 * them
+        kingSquare = bitboards[6*us + 5].bit_length() - 1
+        own = self.colorBitboards[us]
+        occupied = self.occupied
+        orthogonal = bitboards[theirs + 3] | bitboards[theirs + 4] #rooks and queens
+        diagonal = bitboards[theirs + 2] | bitboards[theirs + 4] #bishops and queens
+        checkers = (KNIGHT_ATTACKS[kingSquare] & bitboards[theirs + 1]) | (PAWN_ATTACKS[us][kingSquare] & bitboards[theirs])
+        checkMask = checkers
+        pins = {}
+        for d in range(8):
+            ray = RAYS[d][kingSquare]
+            sliders = orthogonal if d < 4 else diagonal
+            if not ray & sliders:
+                continue
+            positive = POSITIVE_DIRECTIONS[d]
+            blockers = ray & occupied
+            if not blockers:
+                continue
+            first = (blockers & -blockers).bit_length() - 1 if positive else blockers.bit_length() - 1
+            firstBit = 1 << first
+            if firstBit & sliders: #direct check along this line
+                checkers |= firstBit
+                checkMask |= BETWEEN[kingSquare][first] | firstBit
+            elif firstBit & own: #maybe pinned, look for an enemy slider right behind it
+                blockers &= RAYS[d][first]
+                if blockers:
+                    second = (blockers & -blockers).bit_length() - 1 if positive else blockers.bit_length() - 1
+                    secondBit = 1 << second
+                    if secondBit & sliders:
+                        pins[first] = BETWEEN[kingSquare][second] | secondBit
+        return checkers, checkMask, pins
+
+    '''
+    Generates only legal moves: checkers and pins are found once, so no move has to be played to test it
+    '''
+    def getLegalMoves(self):
+        codes = []
+        self.generateLegalMoves(codes)
+        return [Move.fromCode(code) for code in codes]
+
+    '''
+    Appends the packed code of every legal move to moves, a list the caller owns and can reuse between calls, and
+    returns how many were added. stage limits the moves to CAPTURE_MOVES or QUIET_MOVES; a caller generating both
+    stages of one position can pass the getChecksAndPins result so it is only worked out once.
+    '''
+    def generateLegalMoves(self, moves, stage=ALL_MOVES, checksAndPins=None):
+        count = len(moves)
+        append = moves.append
+        us = WHITE if self.whiteToMove else BLACK
+        them = 1 - us
+        bitboards = self.pieceBitboards
+        ours = 6 * us
+        theirs = 6 * them
+        own = self.colorBitboards[us]
+        enemies = self.colorBitboards[them]
+        occupied = self.occupied
+        squares = self.squares
+        kingBit = bitboards[ours + 5]
+        kingSquare = kingBit.bit_length() - 1
+        checkers, checkMask, pins = checksAndPins or self.getChecksAndPins()
+        captures = stage & CAPTURE_MOVES
+        quiets = stage & QUIET_MOVES
+        stageMask = (enemies if captures else 0) | (~occupied & FULL_BOARD if quiets else 0)
+
+        #the king may step to any square the enemy does not attack once the king itself is out of the way
+        withoutKing = occupied ^ kingBit
+        targets = KING_ATTACKS[kingSquare] & stageMask
+        base = kingSquare | (ours + 5) << MOVED_SHIFT
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            to = bit.bit_length() - 1
+            if not self.isSquareAttacked(to, them, withoutKing):
+                append(base | to << 6 | squares[to] << CAPTURED_SHIFT)
+        if checkers & (checkers - 1):
+            return len(moves) - count #double check, only the king can move
+        target = checkMask if checkers else FULL_BOARD
+        target &= ~own
+        pieceTarget = target & stageMask
+
+        for pieceIndex in (1, 2, 3, 4): #knights, bishops, rooks, queens
+            bb = bitboards[ours + pieceIndex]
+            while bb:
+                bit = bb & -bb
+                bb ^= bit
+                square = bit.bit_length() - 1
+                if pieceIndex == 1:
+                    targets = KNIGHT_ATTACKS[square]
+                elif pieceIndex == 2:
+                    targets = slidingAttacks(square, occupied, BISHOP_DIRECTIONS)
+                elif pieceIndex == 3:
+                    targets = slidingAttacks(square, occupied, ROOK_DIRECTIONS)
+                else:
+                    targets = slidingAttacks(square, occupied, DIRECTION_INDICES)
+                targets &= pieceTarget
+                if square in pins:
+                    targets &= pins[square]
+                base = square | (ours + pieceIndex) << MOVED_SHIFT
+                while targets:
+                    bit = targets & -targets
+                    targets ^= bit
+                    to = bit.bit_length() - 1
+                    append(base | to << 6 | squares[to] << CAPTURED_SHIFT)
+
+        step = -8 if us == WHITE else 8
+        homeRow = 6 if us == WHITE else 1
+        lastRow = 1 if us == WHITE else 6 #pawns on this row promote when they move
+        epSquare = self.epSquare
+        bb = bitboards[ours]
+        while bb:
+            bit = bb & -bb
+            bb ^= bit
+            square = bit.bit_length() - 1
+            allowed = target & pins[square] if square in pins else target
+            base = square | ours << MOVED_SHIFT
+            promoting = square >> 3 == lastRow
+            if promoting:
+                base |= PROMOTION << KIND_SHIFT
+            to = square + step
+            if not occupied >> to & 1: #1 square pawn advance
+                if allowed >> to & 1 and (captures if promoting else quiets):
+                    append(base | to << 6 | NO_CAPTURE)
+                to += step
+                if (quiets and square >> 3 == homeRow and not occupied >> to & 1
+                        and allowed >> to & 1): #2 square pawn advance
+                    append(base | to << 6 | DOUBLE_PUSH << KIND_SHIFT | NO_CAPTURE)
+            if not captures:
+                continue
+            attacks = PAWN_ATTACKS[us][square]
+            targets = attacks & enemies & allowed
+            while targets:
+                toBit = targets & -targets
+                targets ^= toBit
+                to = toBit.bit_length() - 1
+                append(base | to << 6 | squares[to] << CAPTURED_SHIFT)
+            if epSquare >= 0 and attacks >> epSquare & 1:
+                capturedBit = 1 << (epSquare - step)
+                #in check the capture has to take the checking pawn or block the check
+                if checkers and not (checkers & capturedBit or checkMask >> epSquare & 1):
+                    continue
+                #both pawns leave the rank at once, so test the king against sliders on the new occupancy
+                after = occupied ^ bit ^ capturedBit ^ (1 << epSquare)
+                if slidingAttacks(kingSquare, after, ROOK_DIRECTIONS) & (bitboards[theirs + 3] | bitboards[theirs + 4]):
+                    continue
+                if slidingAttacks(kingSquare, after, BISHOP_DIRECTIONS) & (bitboards[theirs + 2] | bitboards[theirs + 4]):
+                    continue
+                append(base | epSquare << 6 | EN_PASSANT << KIND_SHIFT | theirs << CAPTURED_SHIFT)
+
+        if not checkers and quiets: #cannot castle while in check
+            base = kingSquare | (ours + 5) << MOVED_SHIFT | CASTLE << KIND_SHIFT | NO_CAPTURE
+            if self.castling & (WHITE_KINGSIDE if us == WHITE else BLACK_KINGSIDE):
+                if (not occupied & (0b110 << kingSquare) and not self.isSquareAttacked(kingSquare + 1, them)
+                        and not self.isSquareAttacked(kingSquare + 2, them)):
+                    append(base | (kingSquare + 2) << 6)
+            if self.castling & (WHITE_QUEENSIDE if us == WHITE else BLACK_QUEENSIDE):
+                if (not occupied & (0b111 << (kingSquare - 3)) and not self.isSquareAttacked(kingSquare - 1, them)
+                        and not self.isSquareAttacked(kingSquare - 2, them)):
+                    append(base | (kingSquare - 2) << 6)
+        return len(moves) - count
+
+    '''
+    The full code of a 16 bit move (start, end and kind, as the transposition table keeps it) when that move is legal
+    here, else 0. Only the one move is looked at: its piece must be able to make it, and the move is played to see
+    that the king is not left in check. Castling and en passant, which are rare here, are checked against the full
+    move list instead.
+    '''
+    def legalCode(self, move):
+        start = move & 63
+        end = move >> 6 & 63
+        kind = move >> KIND_SHIFT & 15
+        squares = self.squares
+        us = WHITE if self.whiteToMove else BLACK
+        piece = squares[start]
+        if piece == NO_PIECE or piece // 6 != us or start == end:
+            return 0
+        if kind == CASTLE or kind == EN_PASSANT:
+            moves = []
+            self.generateLegalMoves(moves)
+            return next((code for code in moves if code & 0xffff == move), 0)
+        captured = squares[end]
+        if captured != NO_PIECE and (captured // 6 == us or captured % 6 == 5):
+            return 0
+        occupied = self.occupied
+        pieceType = piece - 6 * us
+        if pieceType == 0:
+            step = -8 if us == WHITE else 8
+            if kind > PROMOTION or (kind == PROMOTION) != (end >> 3 == (0 if us == WHITE else 7)):
+                return 0
+            if captured != NO_PIECE:
+                if not PAWN_ATTACKS[us][start] >> end & 1 or kind == DOUBLE_PUSH:
+                    return 0
+            elif kind == DOUBLE_PUSH:
+                if (start >> 3 != (6 if us == WHITE else 1) or end != start + 2 * step
+                        or occupied >> (start + step) & 1):
+                    return 0
+            elif end != start + step:
+                return 0
         else:
-            self.checkmate = False
-            self.stalemate = False
-        self.enpassantPossible = tempEnpassantPossible
-        self.currentCastlingRight = tempCastleRight
-        return moves
+            if kind != NORMAL:
+                return 0
+            if pieceType == 1:
+                targets = KNIGHT_ATTACKS[start]
+            elif pieceType == 2:
+                targets = slidingAttacks(start, occupied, BISHOP_DIRECTIONS)
+            elif pieceType == 3:
+                targets = slidingAttacks(start, occupied, ROOK_DIRECTIONS)
+            elif pieceType == 4:
+                targets = slidingAttacks(start, occupied, DIRECTION_INDICES)
+            else:
+                targets = KING_ATTACKS[start]
+            if not targets >> end & 1:
+                return 0
+        code = move | piece << MOVED_SHIFT | captured << CAPTURED_SHIFT
+        if pieceType == 5:
+            return 0 if self.isSquareAttacked(end, 1 - us, occupied ^ (1 << start)) else code
+        self.makeMoveCode(code)
+        self.whiteToMove = not self.whiteToMove
+        leftInCheck = self.inCheck()
+        self.whiteToMove = not self.whiteToMove
+        self.undoMoveCode()
+        return 0 if leftInCheck else code
+
     '''
     Determine if the current player is in check
     '''
     def inCheck(self):
-        if self.whiteToMove:
-            return self.squareUnderAttack(self.whiteKingLocation[0], self.whiteKingLocation[1])
-        else:
-            return self.squareUnderAttack(self.blackKingLocation[0], self.blackKingLocation[1])
+        us = WHITE if self.whiteToMove else BLACK
+        return self.isSquareAttacked(self.pieceBitboards[6*us + 5].bit_length() - 1, 1 - us)
 
     '''
     Determine if the enemy can attack the square r,c
     '''
     def squareUnderAttack(self, r, c):
-        self.whiteToMove =  not self.whiteToMove
-        oppMoves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove
-        for move in oppMoves:
-            if move.endRow == r and move.endCol ==c:
-                return True
-        return  False
+        return self.isSquareAttacked(r*8 + c, BLACK if self.whiteToMove else WHITE)
+
+    '''
+    All pieces of the given colour that attack square, as a bitboard. Instead of generating the attacker's moves this
+    looks outward from the square: knight and king offsets, pawn diagonals and slider rays up to the first blocker.
+    '''
+    def attackers(self, square, color, occupied=None):
+        if occupied is None:
+            occupied = self.occupied
+        bitboards = self.pieceBitboards
+        offset = 6 * color
+        #a pawn of this colour attacks square from where a pawn of the other colour on square would attack
+        found = ((PAWN_ATTACKS[1 - color][square] & bitboards[offset]) | (KNIGHT_ATTACKS[square] & bitboards[offset + 1])
+                 | (KING_ATTACKS[square] & bitboards[offset + 5]))
+        queens = bitboards[offset + 4]
+        diagonal = bitboards[offset + 2] | queens
+        if diagonal:
+            found |= slidingAttacks(square, occupied, BISHOP_DIRECTIONS) & diagonal
+        orthogonal = bitboards[offset + 3] | queens
+        if orthogonal:
+            found |= slidingAttacks(square, occupied, ROOK_DIRECTIONS) & orthogonal
+        return found
 
+    '''
+    Same probes as attackers, but stops at the first piece found
+    '''
+    def isSquareAttacked(self, square, color, occupied=None):
+        if occupied is None:
+            occupied = self.occupied
+        bitboards = self.pieceBitboards
+        offset = 6 * color
+        if (KNIGHT_ATTACKS[square] & bitboards[offset + 1] or PAWN_ATTACKS[1 - color][square] & bitboards[offset]
+                or KING_ATTACKS[square] & bitboards[offset + 5]):
+            return True
+        queens = bitboards[offset + 4]
+        diagonal = (bitboards[offset + 2] | queens) & BISHOP_RAYS[square]
+        if diagonal and slidingAttacks(square, occupied, BISHOP_DIRECTIONS) & diagonal:
+            return True
+        orthogonal = (bitboards[offset + 3] | queens) & ROOK_RAYS[square]
+        return bool(orthogonal and slidingAttacks(square, occupied, ROOK_DIRECTIONS) & orthogonal)
 
+    '''
+    Static exchange evaluation: the material the side to move wins (negative when it loses) by playing the move code
+    and then letting both sides recapture on its end square with their least valuable piece for as long as it pays.
+    Works on bitboards only, nothing is played on the board; sliders behind a capturer join in as it leaves. Pins are
+    not looked at.
+    '''
+    def staticExchange(self, code):
+        start = code & 63
+        end = code >> 6 & 63
+        moved = code >> MOVED_SHIFT & 15
+        kind = code >> KIND_SHIFT & 15
+        bitboards = self.pieceBitboards
+        occupied = self.occupied ^ (1 << start)
+        gain = [SEE_VALUES[code >> CAPTURED_SHIFT & 15]]
+        onSquare = SEE_VALUES[moved]
+        if kind == PROMOTION:
+            gain[0] += SEE_VALUES[4] - SEE_VALUES[0]
+            onSquare = SEE_VALUES[4]
+        elif kind == EN_PASSANT:
+            occupied ^= 1 << (end + 8 if moved < 6 else end - 8)
+        diagonal = bitboards[2] | bitboards[4] | bitboards[8] | bitboards[10]
+        orthogonal = bitboards[3] | bitboards[4] | bitboards[9] | bitboards[10]
+        attackers = (self.attackers(end, WHITE, occupied) | self.attackers(end, BLACK, occupied)) & occupied
+        color = BLACK if moved < 6 else WHITE
+        while True:
+            ours = attackers & self.colorBitboards[color]
+            if not ours:
+                break
+            for pieceIndex in range(6*color, 6*color + 6): #least valuable attacker first
+                candidates = ours & bitboards[pieceIndex]
+                if candidates:
+                    break
+            if pieceIndex % 6 == 5 and attackers & self.colorBitboards[1 - color]:
+                break #the king cannot take a defended piece
+            gain.append(onSquare - gain[-1])
+            onSquare = SEE_VALUES[pieceIndex]
+            occupied ^= candidates & -candidates
+            attackers |= slidingAttacks(end, occupied, BISHOP_DIRECTIONS) & diagonal
+            attackers |= slidingAttacks(end, occupied, ROOK_DIRECTIONS) & orthogonal
+            attackers &= occupied
+            color = 1 - color
+        while len(gain) > 1:
+            last = gain.pop()
+            gain[-1] = -max(-gain[-1], last)
+        return gain[0]
 
     '''
     All moves without considering checks
     '''
     def getAllPossibleMoves(self):
         moves = []
-        for r in range(len(self.board)): #number of rows
-            for c in range(len(self.board[r])):
-                turn = self.board[r][c][0]
-                if (turn =='w' and self.whiteToMove) or (turn == 'b' and not self.whiteToMove):
-                    piece = self.board[r][c][1]
-                    self.moveFunctions[piece](r, c, moves) #calls the appropriate move functions based on piece types
+        color = 'w' if self.whiteToMove else 'b'
+        for piece in 'PNBRQK':
+            bb = self.pieceBitboards[PIECE_INDEX[color + piece]]
+            while bb:
+                bit = bb & -bb
+                bb ^= bit
+                r, c = divmod(bit.bit_length() - 1, 8)
+                self.moveFunctions[piece](r, c, moves) #calls the appropriate move functions based on piece types
 
 
         return moves
 
+    #adds a move from square to every square set in targets
+    def addMoves(self, square, targets, moves, kind=NORMAL):
+        squares = self.squares
+        base = square | squares[square] << MOVED_SHIFT | kind << KIND_SHIFT
+        while targets:
+            bit = targets & -targets
+            targets ^= bit
+            to = bit.bit_length() - 1
+            moves.append(Move.fromCode(base | to << 6 | squares[to] << CAPTURED_SHIFT))
 
     '''
      Gets all pawn moves for the pawn located at row,col and add these moves to the list
     '''
     def getPawnMoves(self, r, c, moves):
+        square = r*8 + c
+        empty = ~self.occupied
         if self.whiteToMove: #White to move
-            if self.board[r-1][c] == "--": #1 square pawn advance
-                moves.append(Move((r, c), (r-1, c), self.board))
-                if r == 6 and self.board[r-2][c] == "--": #2 square pawn advances
-                    moves.append(Move((r, c), (r-2, c), self.board))
-            if c-1 >= 0: #capture to the left
-                if self.board[r-1][c-1][0] == 'b': #enemy piece to capture
-                    moves.append(Move((r, c), (r-1, c-1), self.board))
-                elif (r-1, c-1) == self.enpassantPossible:
-                    moves.append(Move((r, c), (r-1, c-1), self.board, isenpassantMove=True))
-
-            if c+1 <=7: #capture to the right
-                if self.board[r-1][c+1][0] == 'b': #enemy black piece to capture
-                    moves.append(Move((r, c), (r-1, c+1), self.board))
-                elif (r-1, c+1) == self.enpassantPossible:
-                    moves.append(Move((r, c), (r-1, c+1), self.board, isenpassantMove=True))
-
-
+            step = -8
+            homeRow = 6
+            enemies = self.colorBitboards[BLACK]
+            attacks = PAWN_ATTACKS[WHITE][square]
         else: #black pawn moves
-            if self.board[r+1][c] == "--": #1 square pawn advance
-                moves.append(Move((r, c), (r+1, c), self.board))
-                if r == 1 and self.board[r+2][c] == "--": #2 square pawn advance
-                    moves.append(Move((r, c), (r+2, c), self.board))
-            if c-1 >= 0: #capture to the right
-                if self.board[r+1][c-1][0] == 'w':
-                    moves.append(Move((r, c), (r+1, c-1), self.board))
-                elif (r + 1, c - 1) == self.enpassantPossible:
-                    moves.append(Move((r, c), (r + 1, c - 1), self.board, isenpassantMove=True))
-            if c+1 <= 7: #capture to the left
-                if self.board[r+1][c+1][0] == 'w':
-                    moves.append(Move((r, c), (r+1, c+1), self.board))
-                elif (r+1, c+1) == self.enpassantPossible:
-                    moves.append(Move((r, c), (r+1, c+1), self.board, isenpassantMove=True))
+            step = 8
+            homeRow = 1
+            enemies = self.colorBitboards[WHITE]
+            attacks = PAWN_ATTACKS[BLACK][square]
+        kind = PROMOTION if r == 7 - homeRow else NORMAL #one row short of the far side
+        if empty >> (square + step) & 1: #1 square pawn advance
+            self.addMoves(square, 1 << (square + step), moves, kind)
+            if r == homeRow and empty >> (square + 2*step) & 1: #2 square pawn advances
+                self.addMoves(square, 1 << (square + 2*step), moves, DOUBLE_PUSH)
+        self.addMoves(square, attacks & enemies, moves, kind) #enemy piece to capture
+        if self.epSquare >= 0:
+            epSquare = self.epSquare
+            if attacks >> epSquare & 1:
+                moves.append(Move.fromCode(square | epSquare << 6 | EN_PASSANT << KIND_SHIFT
+                                           | self.squares[square] << MOVED_SHIFT | (6 - self.squares[square]) << CAPTURED_SHIFT))
 
     '''
          Gets all Rook moves for the rook located at row,col and add these moves to the list
     '''
     def getRookMoves(self, r, c, moves):
-        directions = ((-1, 0),(0, -1), (1, 0), (0, 1))
-        enemyColor = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0]*i
-                endCol = c + d[1]*i
-                if 0 <= endRow < 8 and 0 <= endCol < 8: # on board
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece == "--": #check if the space is empty
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                    elif endPiece[0] == enemyColor: # enemy piece valid
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                        break
-                    else: #friendly place invalid
-                        break
-                else:
-                    break
-
-
-
-
+        square = r*8 + c
+        allies = self.colorBitboards[WHITE if self.whiteToMove else BLACK]
+        self.addMoves(square, slidingAttacks(square, self.occupied, ROOK_DIRECTIONS) & ~allies, moves)
 
     '''
          Gets all Knight moves for the Knight located at row,col and add these moves to the list
     '''
     def getKnightMoves(self, r, c, moves):
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2),(1, -2), (1, 2), (2, -1), (2, 1))
-        allyColor = "w" if self.whiteToMove else "b"
-        for n in knightMoves:
-            endRow = r + n[0]
-            endCol = c + n[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8 :
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor:
-                    moves.append(Move((r, c), (endRow, endCol), self.board))
+        square = r*8 + c
+        allies = self.colorBitboards[WHITE if self.whiteToMove else BLACK]
+        self.addMoves(square, KNIGHT_ATTACKS[square] & ~allies, moves)
 
 
     '''
        Gets all Bishop moves for the Bishop located at row,col and add these moves to the list
     '''
     def getBishopMoves(self, r, c, moves):
-        directions = ((-1, 1), (1, -1), (-1, -1), (1, 1))
-        enemyColor = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:  # on board
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece == "--":  # check if the space is empty
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                    elif endPiece[0] == enemyColor:  # enemy piece valid
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                        break
-                    else:  # friendly place invalid
-                        break
-                else:
-                    break
+        square = r*8 + c
+        allies = self.colorBitboards[WHITE if self.whiteToMove else BLACK]
+        self.addMoves(square, slidingAttacks(square, self.occupied, BISHOP_DIRECTIONS) & ~allies, moves)
 
     '''
        Gets all Queen moves for the Queen located at row,col and add these moves to the list
@@ -318,15 +1056,9 @@ class GameState():
        Gets all King moves for the King located at row,col and add these moves to the list
     '''
     def getKingMoves(self, r, c, moves):
-        kingMoves = ((-1, 0),(0, -1), (1, 0), (0, 1), (-1, 1), (1, -1), (-1, -1), (1, 1))
-        allyColor = "w" if self.whiteToMove else "b"
-        for k in range(8):
-            endRow = r + kingMoves[k][0]
-            endCol = c + kingMoves[k][1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:  # on board
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor:  # enemy piece valid
-                    moves.append(Move((r, c), (endRow, endCol), self.board))
+        square = r*8 + c
+        allies = self.colorBitboards[WHITE if self.whiteToMove else BLACK]
+        self.addMoves(square, KING_ATTACKS[square] & ~allies, moves)
 
 
 
@@ -337,21 +1069,23 @@ class GameState():
     def getCastleMoves(self, r, c, moves):
         if self.squareUnderAttack(r, c):
             return # cannot castle while in check
-        if (self.whiteToMove and self.currentCastlingRight.wks) or (not self.whiteToMove and self.currentCastlingRight.bks):
+        if self.castling & (WHITE_KINGSIDE if self.whiteToMove else BLACK_KINGSIDE):
             self.getKingSideCastleMoves(r, c, moves)
-        if (self.whiteToMove and self.currentCastlingRight.wqs) or (not self.whiteToMove and self.currentCastlingRight.bqs):
+        if self.castling & (WHITE_QUEENSIDE if self.whiteToMove else BLACK_QUEENSIDE):
             self.getQueenSideCastleMoves(r, c, moves)
 
     def getKingSideCastleMoves(self, r, c, moves):
-        if self.board[r][c+1] == '--' and self.board[r][c+2] == '--':
+        square = r*8 + c
+        if not self.occupied & (0b110 << square):
             if not self.squareUnderAttack(r, c+1) and not self.squareUnderAttack(r, c+2):
-                moves.append(Move((r, c), (r, c+2), self.board, isCastleMove= True))
+                self.addMoves(square, 1 << (square + 2), moves, CASTLE)
 
 
     def getQueenSideCastleMoves(self, r, c, moves):
-        if self.board[r][c-1] == '--' and self.board[r][c-2] == '--' and self.board[r][c-3] == '--':
+        square = r*8 + c
+        if not self.occupied & (0b111 << (square - 3)):
             if not self.squareUnderAttack(r, c-1) and not self.squareUnderAttack(r, c-2):
-                moves.append(Move((r, c), (r, c-2), self.board, isCastleMove= True))
+                self.addMoves(square, 1 << (square - 2), moves, CASTLE)
 
 
 
@@ -381,25 +1115,59 @@ class Move():
                    "e": 4, "f": 5, "g": 6, "h": 7}
     colsToFiles = {v: k for k, v in filesToCols.items()}
 
+    #no per-instance dict, the search makes none of these but the UI still makes one per legal move
+    __slots__ = ('startRow', 'startCol', 'endRow', 'endCol', 'startSquare', 'endSquare', 'pieceMoved', 'pieceCaptured',
+                 'isPawnPromotion', 'isenpassantMove', 'isCastleMove', 'moveID', 'code')
+
     def __init__(self, startSq, endSq, board, isenpassantMove=False, isCastleMove = False):
-        self.startRow = int(startSq[0])
-        self.startCol = int(startSq[1])
-        self.endRow = int(endSq[0])
-        self.endCol = int(endSq[1])
-        self.pieceMoved = board[self.startRow][self.startCol]
-        self.pieceCaptured = board[self.endRow][self.endCol]
-        self.isPawnPromotion = False
-        self.isenpassantMove = False
-        if (self.pieceMoved == 'wP' and self.endRow == 0) or (self.pieceMoved == 'bP' and self.endRow == 7):
-            self.isPawnPromotion = True
-        self.isenpassantMove = isenpassantMove
-        if self.isenpassantMove:
-            if self.pieceMoved == 'bP':
-                self.pieceCaptured = 'wP'
-            else:
-                self.pieceCaptured = 'bP'
-        #Castle move
-        self.isCastleMove= isCastleMove
+        startRow = int(startSq[0])
+        startCol = int(startSq[1])
+        endRow = int(endSq[0])
+        endCol = int(endSq[1])
+        pieceMoved = board[startRow][startCol]
+        pieceCaptured = board[endRow][endCol]
+        start = startRow*8 + startCol
+        end = endRow*8 + endCol
+        moved = PIECE_INDEX.get(pieceMoved, NO_PIECE)
+        captured = PIECE_INDEX.get(pieceCaptured, NO_PIECE)
+        if isenpassantMove:
+            kind = EN_PASSANT
+            captured = 6 - moved #the other colour's pawn
+        elif isCastleMove:
+            kind = CASTLE
+        elif pieceMoved[1:] == 'P' and endRow in (0, 7):
+            kind = PROMOTION
+        elif pieceMoved[1:] == 'P' and abs(endRow - startRow) == 2:
+            kind = DOUBLE_PUSH
+        else:
+            kind = NORMAL
+        self.setUp(start | end << 6 | kind << KIND_SHIFT | (moved & 15) << MOVED_SHIFT | captured << CAPTURED_SHIFT)
+
+    '''
+    Unpacks a move code from GameState.generateLegalMoves into a Move
+    '''
+    @classmethod
+    def fromCode(cls, code):
+        move = cls.__new__(cls)
+        move.setUp(code)
+        return move
+
+    def setUp(self, code):
+        self.code = code
+        start = code & 63
+        end = code >> 6 & 63
+        kind = code >> KIND_SHIFT & 15
+        self.startRow = start >> 3
+        self.startCol = start & 7
+        self.endRow = end >> 3
+        self.endCol = end & 7
+        self.startSquare = start
+        self.endSquare = end
+        self.pieceMoved = PIECE_NAMES[code >> MOVED_SHIFT & 15]
+        self.pieceCaptured = PIECE_NAMES[code >> CAPTURED_SHIFT]
+        self.isPawnPromotion = kind == PROMOTION
+        self.isenpassantMove = kind == EN_PASSANT
+        self.isCastleMove = kind == CASTLE
 
         self.moveID = self.startRow *1000 + self.startCol *100 + self.endRow*10 + self.endCol
         #print(self.moveID)
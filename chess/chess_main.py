@@ -1,14 +1,21 @@
 """
 This in the main driver file, responsible for handling user input and displaying the current Game state object
 """
+import time
 import pygame as p
 from chess import chess_engine, ChessAI
+from chess.ai_worker import AIWorker
 
 WIDTH = HEIGHT = 520
 DIMENSION = 8
 SQ_SIZE = HEIGHT/DIMENSION
 MAX_FPS = 15 #for animations
 IMAGES = {}
+FONTS = {} #(size, bold) -> font, SysFont is slow so every size is only made once
+HIGHLIGHTS = {} #colour name -> translucent square surface
+SHOW_FRAME_TIME = False #frame time overlay in the top right corner, toggled with 'f'
+#events after which the window may have lost what was drawn on it; the WINDOW ones only exist in pygame 2
+EXPOSE_EVENTS = {getattr(p, name) for name in ('VIDEOEXPOSE', 'WINDOWEXPOSED', 'WINDOWRESTORED') if hasattr(p, name)}
 
 '''
 Initialise a global dictionary of images. This will be called once in main
@@ -33,18 +40,24 @@ def main():
     moveMade = False #flag variable for when a move is made
 
     loadImages() #Only do this once, before the while loop
+    renderer = BoardRenderer(screen)
+    showFrameTime = SHOW_FRAME_TIME
+    frameTime = 0.0
     running = True
     sqSelected = () # no square is selected currently, keeps track of the last click of the user(Tuple: x,y)
     playerClicks = [] #keep track of the player clicks (two tuples: [(6,4),(4,4)]
     gameOver = False
     playerOne = True # If a human is playing white it's true if AI is playing then False
     playerTwo = True # same as above
+    aiWorker = AIWorker() #the AI thinks in a background thread so the window stays responsive
 
 
     while running:
+        frameStart = time.perf_counter()
         humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
         for e in p.event.get():
             if e.type == p.QUIT:
+                aiWorker.shutdown()
                 running = False
             #Mouse Handler
             elif e.type == p.MOUSEBUTTONDOWN:
@@ -73,26 +86,35 @@ def main():
             #Key Handler
             elif e.type == p.KEYDOWN:
                 if e.key == p.K_s: #undo when 's' is pressed
+                    aiWorker.cancel()
                     gs.undoMove(move)
                     moveMade = True
                     gameOver = False
                 if e.key == p.K_r: #reset the board if r is pressed
+                    aiWorker.cancel()
                     gs = chess_engine.GameState()
+                    ChessAI.transpositionTable.clear() #positions from the old game are of no use
                     validMoves = gs.getValidMoves()
                     sqSelected = ()
                     playerClicks = []
                     moveMade = False
                     gameOver = False
-
+                    renderer.invalidate()
+                if e.key == p.K_f: #frame time overlay on/off
+                    showFrameTime = not showFrameTime
+            elif e.type in EXPOSE_EVENTS:
+                renderer.invalidate() #draw the whole board again
 
 
         #AI move finder logic
-        if not gameOver and not humanTurn:
-            AIMove = ChessAI.findBestMoveMinMax(gs, validMoves)
-            if AIMove is None:
-                AIMove = ChessAI.findRandomMove(validMoves)
-            gs.makeMove(AIMove)
-            moveMade = True
+        if not gameOver and not humanTurn and not moveMade and running: #humanTurn is stale after a move or undo
+            if not aiWorker.thinking:
+                aiWorker.start(gs, validMoves)
+            else:
+                AIMove = aiWorker.poll()
+                if AIMove is not None:
+                    gs.makeMove(AIMove)
+                    moveMade = True
 
 
         if moveMade:
@@ -100,83 +122,172 @@ def main():
             moveMade = False
 
 
-        drawGameState(screen, gs, validMoves, sqSelected)
-
+        overlays = []
         if gs.checkmate:
             gameOver = True
             if gs.whiteToMove:
-                drawText(screen, 'Black wins by checkmate. Get rekt!!')
+                overlays.append(textOverlay('Black wins by checkmate. Get rekt!!'))
             else:
-                drawText(screen, 'White wins by checkmate. Get rekt!!')
+                overlays.append(textOverlay('White wins by checkmate. Get rekt!!'))
         elif gs.stalemate:
             gameOver = True
-            drawText(screen, 'Stalemate!!')
-
-
-
+            overlays.append(textOverlay('Stalemate!!'))
+        elif gs.gameStatus() == chess_engine.FIFTY_MOVES:
+            gameOver = True
+            overlays.append(textOverlay('Draw by the fifty move rule'))
+        elif gs.gameStatus() == chess_engine.REPETITION:
+            gameOver = True
+            overlays.append(textOverlay('Draw by threefold repetition'))
+        if aiWorker.thinking:
+            overlays.append(statusOverlay(aiWorker.status()))
+        if showFrameTime:
+            overlays.append(("%.1f ms  %.0f fps" % (frameTime, clock.get_fps()), 18, False, 'Red', 'topright'))
+
+        #only the squares that look different from the last frame are drawn and sent to the display
+        dirtyRects = renderer.draw(gs, validMoves, sqSelected, overlays)
+        if dirtyRects:
+            p.display.update(dirtyRects)
+        frameTime = (time.perf_counter() - frameStart) * 1000
         clock.tick(MAX_FPS)
-        p.display.flip()
 
 
 
 '''
-Highlights square selected and possible moves
+Which highlight each square gets: blue for the selected piece, yellow for the squares it can move to
 '''
-def highlightSquare(screen, gs, validmoves, sqSelected):
+def highlightSquares(gs, validmoves, sqSelected):
+    highlights = {}
     if sqSelected != ():
         r, c = sqSelected
         r=int(r)
         c=int(c)
         if gs.board[r][c][0] == ('w' if gs.whiteToMove else 'b'): #sqSelected is a piece
-            #Highlight the selected square
-            s = p.Surface((SQ_SIZE, SQ_SIZE))
-            s.set_alpha(100) #Transparency Value
-            s.fill(p.Color('blue'))
-            screen.blit(s, (c*SQ_SIZE, r*SQ_SIZE))
-            #Highlight all possible moves
-            s.fill(p.Color('yellow'))
+            highlights[r*8 + c] = 'blue'
             for move in validmoves:
                 if move.startRow == r and move.startCol == c:
-                    screen.blit(s, (move.endCol*SQ_SIZE, move.endRow*SQ_SIZE))
-
-
-
+                    highlights[move.endSquare] = 'yellow'
+    return highlights
 
 
-
-def drawGameState(screen, gs, validmoves, sqSelected):
-    drawBoard(screen) #draw squares in the board
-    highlightSquare(screen, gs, validmoves, sqSelected)
-    drawPieces(screen, gs.board) #Draw pieces on top of the squares
-
+'''
+Keeps what every square showed in the last frame and only draws the squares whose piece or highlight changed, plus
+the squares under text overlays that appeared, changed or went away. draw returns the rects for display.update,
+an empty list when nothing changed, so an idle board costs next to nothing.
+'''
+class BoardRenderer():
+    def __init__(self, screen):
+        self.screen = screen
+        self.background = drawBoard(p.Surface((WIDTH, HEIGHT)))
+        self.drawn = [None] * 64 #(piece, highlight) shown on each square
+        self.overlays = [] #overlays shown, as (overlay, rendered text, rect)
+
+    '''
+    Forces every square to be drawn again on the next frame
+    '''
+    def invalidate(self):
+        self.drawn = [None] * 64
+
+    def draw(self, gs, validmoves, sqSelected, overlays):
+        board = gs.board
+        highlights = highlightSquares(gs, validmoves, sqSelected)
+        dirty = set()
+        for square in range(64):
+            look = (board[square >> 3][square & 7], highlights.get(square))
+            if self.drawn[square] != look:
+                self.drawn[square] = look
+                dirty.add(square)
+        if overlays != [overlay for overlay, text, rect in self.overlays]:
+            rendered = []
+            for overlay in overlays:
+                text = renderOverlay(overlay)
+                rendered.append((overlay, text, overlayRect(overlay, text)))
+            for overlay, text, rect in self.overlays + rendered:
+                dirty.update(squaresUnder(rect))
+            self.overlays = rendered
+        if not dirty:
+            return []
+
+        rects = []
+        for square in dirty:
+            piece, highlight = self.drawn[square]
+            rect = p.Rect((square & 7)*SQ_SIZE, (square >> 3)*SQ_SIZE, SQ_SIZE, SQ_SIZE)
+            self.screen.blit(self.background, rect, rect)
+            if highlight is not None:
+                self.screen.blit(getHighlight(highlight), rect)
+            if piece != "--": #not empty
+                self.screen.blit(IMAGES[piece], rect)
+            rects.append(rect)
+        #overlays are drawn again whenever a square under them was, so they always stay on top
+        for overlay, text, rect in self.overlays:
+            if rect.collidelist(rects) != -1:
+                self.screen.blit(text, rect)
+        return rects
 
 
 '''
-Draws Squares on the board
+Draws the squares of the board onto surface, done once for the background every square is copied from
 '''
-def drawBoard(screen):
+def drawBoard(surface):
     colors = [p.Color("white"), p.Color("gray")]
     for r in range(DIMENSION):
         for c in range(DIMENSION):
             color = colors[((r+c) % 2)]
-            p.draw.rect(screen, color, p.Rect(c*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE))
+            p.draw.rect(surface, color, p.Rect(c*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE))
+    return surface
+
+
+def getHighlight(color):
+    if color not in HIGHLIGHTS:
+        s = p.Surface((SQ_SIZE, SQ_SIZE))
+        s.set_alpha(100) #Transparency Value
+        s.fill(p.Color(color))
+        HIGHLIGHTS[color] = s
+    return HIGHLIGHTS[color]
+
+
+def getFont(size, bold):
+    if (size, bold) not in FONTS:
+        FONTS[(size, bold)] = p.font.SysFont("Helvitca", size, bold, False)
+    return FONTS[(size, bold)]
+
 
 '''
-Draw the pieces on the board using the current GameState.board
+Overlays are (text, size, bold, colour, position) tuples, position being 'center', 'bottomleft' or 'topright'
 '''
-def drawPieces(screen, board):
-    for r in range(DIMENSION):
-        for c in range(DIMENSION):
-            piece=board[r][c]
-            if piece != "--": #not empty
-                screen.blit(IMAGES[piece], p.Rect(c*SQ_SIZE,r*SQ_SIZE, SQ_SIZE, SQ_SIZE))
+def textOverlay(text):
+    return (text, 32, True, 'Black', 'center')
+
+
+#small text in the bottom left corner, e.g. the thinking indicator
+def statusOverlay(text):
+    return (text, 20, False, 'Blue', 'bottomleft')
+
+
+def renderOverlay(overlay):
+    text, size, bold, color, position = overlay
+    return getFont(size, bold).render(text, 0, p.Color(color))
+
+
+def overlayRect(overlay, text):
+    rect = text.get_rect()
+    position = overlay[4]
+    if position == 'center':
+        rect.center = (WIDTH/2, HEIGHT/2)
+    elif position == 'bottomleft':
+        rect.bottomleft = (4, HEIGHT - 4)
+    else:
+        rect.topright = (WIDTH - 4, 4)
+    return rect
 
 
-def drawText(screen, text):
-    font = p.font.SysFont("Helvitca", 32, True, False)
-    textObject = font.render(text, 0, p.Color('Black'))
-    textLocation = p.Rect(0, 0, WIDTH, HEIGHT). move(WIDTH/2 - textObject.get_width()/2, HEIGHT/2 - textObject.get_height()/2)
-    screen.blit(textObject, textLocation)
+#squares a rect on the screen touches
+def squaresUnder(rect):
+    rect = rect.clip(p.Rect(0, 0, WIDTH, HEIGHT))
+    if rect.width <= 0 or rect.height <= 0:
+        return []
+    firstCol, lastCol = int(rect.left // SQ_SIZE), int((rect.right - 1) // SQ_SIZE)
+    firstRow, lastRow = int(rect.top // SQ_SIZE), int((rect.bottom - 1) // SQ_SIZE)
+    return [r*8 + c for r in range(firstRow, lastRow + 1) for c in range(firstCol, lastCol + 1)]
 
 if __name__ == "__main__":
     main()
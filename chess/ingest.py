@@ -0,0 +1,166 @@
+"""
+Streaming PGN ingestion: replays every game of PGN files (or stdin) and writes one JSON object per position to stdout,
+for book building, test set extraction and regression runs over large game collections.
+
+    python -m chess.ingest games.pgn -w 8 > positions.jsonl
+    zcat lichess.pgn.gz | python -m chess.ingest - --plies 40 --no-fen --every 10 > positions.jsonl
+
+Every record holds the game number, the ply, the position before the move (FEN and zobrist key), the move played in
+the engine's notation and in SAN, and the game's result. The input is cut into batches of whole games in this process
+without parsing them; the workers parse the SAN against GameState.getValidMoves and replay the games. Only a bounded
+number of batches is in flight at once and nothing is kept per game, so memory stays flat for files of any size.
+Games stop at the first move the engine cannot play (an underpromotion, an illegal or unreadable move, a FEN tag it
+rejects or fails on); their positions up to there are still written and the game is counted as stopped. Throughput in
+games per second goes to stderr.
+"""
+import argparse
+import fileinput
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from chess import pgn
+
+GAMES_PER_BATCH = 64
+BATCHES_PER_WORKER = 4 #how far reading may run ahead of the workers
+
+
+'''
+Whether a {...} comment is still open at the end of line, given whether one was open at its start. Braces after a ;
+are in a comment to the end of the line and do not count, the way pgn.tokenize reads them.
+'''
+def commentOpen(line, inComment):
+    i = 0
+    while True:
+        if inComment:
+            i = line.find('}', i)
+            if i < 0:
+                return True
+            inComment = False
+        else:
+            semicolon = line.find(';', i)
+            i = line.find('{', i)
+            if i < 0 or 0 <= semicolon < i:
+                return False
+            inComment = True
+        i += 1
+
+
+'''
+Cuts PGN lines into batches of size games, each one string, at the tag pairs that start a new game. Only line
+starts and comment braces are looked at, the parsing is left to the workers.
+'''
+def readBatches(lines, size=GAMES_PER_BATCH):
+    batch = []
+    games = 0
+    inMoves = False
+    inComment = False #a line starting with [ inside a {...} comment does not start a game
+    for line in lines:
+        if not inComment and line.startswith('['):
+            if inMoves:
+                inMoves = False
+                games += 1
+                if games == size:
+                    yield "".join(batch)
+                    batch = []
+                    games = 0
+        elif line.strip():
+            inMoves = True
+            inComment = commentOpen(line, inComment)
+        batch.append(line)
+    if batch:
+        yield "".join(batch)
+
+
+'''
+Replays the games of one batch. Returns one (stopped, records) pair per game, the records as JSON text without the
+game number, which only the reading process can know.
+'''
+def ingestBatch(text, maxPlies=None, withFEN=True):
+    games = []
+    for game in pgn.readGames(text.splitlines()):
+        result = game.result
+        records = []
+        stopped = False
+        try:
+            for ply, (gs, move) in enumerate(pgn.replay(game)):
+                if maxPlies is not None and ply >= maxPlies:
+                    break
+                record = {'ply': ply}
+                if withFEN:
+                    record['fen'] = gs.getFEN()
+                record['key'] = "%016x" % gs.zobristKey
+                record['move'] = move.getChessNotation()
+                record['san'] = game.moves[ply]
+                record['result'] = result
+                records.append(json.dumps(record))
+        except Exception: #ValueError for a move or FEN tag the engine cannot read, anything else from a position
+            stopped = True #the engine fails on; either way only this game stops
+        games.append((stopped, records))
+    return games
+
+
+'''
+Ingests every batch and yields (game number, stopped, records) per game in input order, game numbers from 1. With one
+worker everything runs in this process.
+'''
+def ingestStream(batches, workers, maxPlies=None, withFEN=True):
+    number = 0
+    if workers <= 1:
+        for batch in batches:
+            for stopped, records in ingestBatch(batch, maxPlies, withFEN):
+                number += 1
+                yield number, stopped, records
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        batches = iter(batches)
+        while True:
+            for batch in batches:
+                pending.append(pool.submit(ingestBatch, batch, maxPlies, withFEN))
+                if len(pending) >= workers * BATCHES_PER_WORKER:
+                    break
+            if not pending:
+                return
+            for stopped, records in pending.popleft().result():
+                number += 1
+                yield number, stopped, records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay PGN games and write every position as a JSON line")
+    parser.add_argument('files', nargs='*', help="PGN files, - or nothing for stdin")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--plies', type=int, help="positions of every game to write, all of them by default")
+    parser.add_argument('--no-fen', dest='fen', action='store_false', help="leave the FEN out, the key is enough")
+    parser.add_argument('--count-only', action='store_true', help="only replay and count, write no records")
+    parser.add_argument('--every', type=float, default=5.0, help="seconds between progress lines on stderr")
+    args = parser.parse_args(argv)
+
+    games = positions = stopped = 0
+    start = time.perf_counter()
+    nextReport = args.every #seconds after start
+    write = sys.stdout.write
+    with fileinput.input(args.files or ['-'], encoding='utf-8', errors='replace') as lines:
+        for number, gameStopped, records in ingestStream(readBatches(lines), args.workers, args.plies, args.fen):
+            games += 1
+            positions += len(records)
+            stopped += gameStopped
+            if not args.count_only:
+                prefix = '{"game": %d, ' % number
+                for record in records:
+                    write(prefix + record[1:] + "\n")
+            if games & 255 == 0 and time.perf_counter() - start >= nextReport:
+                seconds = time.perf_counter() - start
+                sys.stderr.write("... %d games, %d positions, %.1f games/s\n" % (games, positions, games / seconds))
+                nextReport = seconds - seconds % args.every + args.every #the next multiple, however late this one was
+    seconds = time.perf_counter() - start
+    sys.stderr.write("%d games (%d stopped early), %d positions in %.1fs, %.1f games/s\n" % (
+        games, stopped, positions, seconds, games / seconds if seconds else 0))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
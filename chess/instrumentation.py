@@ -0,0 +1,232 @@
+"""
+Opt-in instrumentation of the move generator and the search: call counters, per-depth timings and branching factors,
+a stats object after every search, a periodic progress callback while searching, and cProfile or flame graph dumps.
+
+    python -m chess.instrumentation -d 5
+    python -m chess.instrumentation "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3" -t 3 \\
+        --profile search.prof --flame search.folded
+
+The counters cost nothing while they are off: enable() swaps counting wrappers in for the counted GameState, Move
+and evaluation methods, and disable() puts the originals back, so the hot path is untouched unless somebody asked.
+Only the calling process is counted, not the workers of the parallel search. The flame graph file is in the folded
+stack format of flamegraph.pl and speedscope, sampled from the search thread.
+"""
+import argparse
+import cProfile
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from chess import chess_engine
+
+COUNTERS = ('getValidMoves', 'generateLegalMoves', 'squareUnderAttack', 'isSquareAttacked', 'moves', 'evaluations')
+#(class, method name, counter) for every counting wrapper enable() installs
+_COUNTED = [
+    (chess_engine.GameState, 'getValidMoves', 'getValidMoves'),
+    (chess_engine.GameState, 'generateLegalMoves', 'generateLegalMoves'),
+    (chess_engine.GameState, 'squareUnderAttack', 'squareUnderAttack'),
+    (chess_engine.GameState, 'isSquareAttacked', 'isSquareAttacked'),
+    (chess_engine.GameState, 'evaluate', 'evaluations'),
+    (chess_engine.Move, '__init__', 'moves'),
+    (chess_engine.Move, 'fromCode', 'moves'),
+]
+
+counters = dict.fromkeys(COUNTERS, 0)
+enabled = False
+_originals = []
+
+
+def _countingWrapper(function, counter):
+    def wrapper(*args, **kwargs):
+        counters[counter] += 1
+        return function(*args, **kwargs)
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    return wrapper
+
+
+'''
+Starts counting. Counters keep running totals until reset; searches report the difference over their own run.
+'''
+def enable():
+    global enabled
+    if enabled:
+        return
+    for cls, name, counter in _COUNTED:
+        original = cls.__dict__[name]
+        _originals.append((cls, name, original))
+        if isinstance(original, classmethod):
+            setattr(cls, name, classmethod(_countingWrapper(original.__func__, counter)))
+        else:
+            setattr(cls, name, _countingWrapper(original, counter))
+    enabled = True
+
+
+def disable():
+    global enabled
+    while _originals:
+        cls, name, original = _originals.pop()
+        setattr(cls, name, original)
+    enabled = False
+
+
+def reset():
+    for counter in COUNTERS:
+        counters[counter] = 0
+
+
+def snapshot():
+    return dict(counters)
+
+
+'''
+What one search did, taken from the Search after (or during) its run:
+nodes, quiescenceNodes and mainNodes, seconds and nps, the transposition table's probes, hits and hitRate, the move
+orderer's cutoff statistics, one record per finished iteration (depth, seconds, nodes, quiescenceNodes, and the
+branching factor: nodes of the iteration over nodes of the one before), and, while counting is enabled, the counters
+of the calls made during the search.
+'''
+class SearchStats():
+    def __init__(self, search):
+        self.nodes = search.nodes
+        self.quiescenceNodes = search.quiescenceNodes
+        self.mainNodes = search.nodes - search.quiescenceNodes
+        self.depth = search.depth
+        self.seconds = time.perf_counter() - search.startTime if search.endTime is None else \
+            search.endTime - search.startTime
+        self.nps = int(self.nodes / self.seconds) if self.seconds > 0 else 0
+        self.tableProbes = search.table.probes - search.tableAtStart[0]
+        self.tableHits = search.table.hits - search.tableAtStart[1]
+        self.hitRate = self.tableHits / self.tableProbes if self.tableProbes else 0.0
+        self.cutoffs = search.orderer.getStats()
+        self.iterations = []
+        previous = None
+        last = (0, 0, 0)
+        for depth, seconds, nodes, quiescenceNodes in search.iterations:
+            iterationNodes = nodes - last[1]
+            self.iterations.append({'depth': depth, 'seconds': seconds - last[0], 'nodes': iterationNodes,
+                                    'quiescenceNodes': quiescenceNodes - last[2],
+                                    'branchingFactor': iterationNodes / previous if previous else None})
+            previous = iterationNodes
+            last = (seconds, nodes, quiescenceNodes)
+        factors = [record['branchingFactor'] for record in self.iterations if record['branchingFactor']]
+        self.branchingFactor = factors[-1] if factors else None #of the deepest iteration
+        self.counters = {}
+        if search.countersAtStart is not None:
+            self.counters = {name: counters[name] - search.countersAtStart[name] for name in COUNTERS}
+
+    def asDict(self):
+        return dict(self.__dict__)
+
+    def report(self):
+        lines = ["depth %d, %d nodes (%d main, %d quiescence) in %.2fs, %d nps" % (
+            self.depth, self.nodes, self.mainNodes, self.quiescenceNodes, self.seconds, self.nps)]
+        lines.append("table %d probes, %d hits (%.1f%%); first move cutoffs %.1f%% of %d" % (
+            self.tableProbes, self.tableHits, 100 * self.hitRate, 100 * self.cutoffs['firstMoveCutoffRate'],
+            self.cutoffs['cutoffs']))
+        lines.append("depth     seconds       nodes  quiescence  branching")
+        for record in self.iterations:
+            factor = "%9.2f" % record['branchingFactor'] if record['branchingFactor'] else "        -"
+            lines.append("%5d %11.3f %11d %11d  %s" % (record['depth'], record['seconds'], record['nodes'],
+                                                      record['quiescenceNodes'], factor))
+        for name, count in self.counters.items():
+            lines.append("%-18s %12d" % (name, count))
+        return "\n".join(lines)
+
+
+'''
+Samples the stack of one thread every interval seconds; write() saves the samples in the folded stack format
+("outer;inner;leaf count" lines) that flame graph tools read
+'''
+class StackSampler():
+    def __init__(self, thread=None, interval=0.001):
+        self.threadId = (thread or threading.current_thread()).ident
+        self.interval = interval
+        self.samples = Counter()
+        self.running = False
+        self.sampler = None
+
+    def start(self):
+        self.running = True
+        self.sampler = threading.Thread(target=self.run, daemon=True)
+        self.sampler.start()
+
+    def stop(self):
+        self.running = False
+        if self.sampler is not None:
+            self.sampler.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def run(self):
+        while self.running:
+            time.sleep(self.interval)
+            frame = sys._current_frames().get(self.threadId)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append("%s:%s" % (code.co_filename.rsplit('/', 1)[-1], code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write("%s %d\n" % (stack, count))
+
+
+def main(argv=None):
+    from chess import ChessAI, instrumentation #the module ChessAI sees, not this one when run with -m
+    parser = argparse.ArgumentParser(description="Search a position with instrumentation on and report what it did")
+    parser.add_argument('fen', nargs='?', help="position to search, the start position by default")
+    parser.add_argument('-d', '--depth', type=int, help="search depth (default 5 when no time is given)")
+    parser.add_argument('-t', '--time', type=float, help="seconds to search")
+    parser.add_argument('--every', type=float, default=1.0, help="seconds between progress lines")
+    parser.add_argument('--profile', help="write cProfile data to this file (for pstats, snakeviz, ...)")
+    parser.add_argument('--flame', help="write sampled stacks in folded format to this file (for flamegraph.pl)")
+    args = parser.parse_args(argv)
+
+    gs = chess_engine.GameState.fromFEN(args.fen) if args.fen else chess_engine.GameState()
+    search = ChessAI.Search(gs, args.time, None, args.depth or (ChessAI.MAX_DEPTH if args.time else 5))
+    search.progressInterval = args.every
+    search.onProgress = lambda s: print("... depth %d, %d nodes, %d nps" % (
+        s.depth + 1, s.nodes, s.nodes / (time.perf_counter() - s.startTime)))
+    search.onIteration = lambda s: print("depth %d done: %s score %d" % (
+        s.depth, chess_engine.Move.fromCode(s.bestCode).getChessNotation(), s.bestScore))
+    validMoves = gs.getValidMoves()
+    instrumentation.enable()
+    profiler = cProfile.Profile() if args.profile else None
+    sampler = StackSampler() if args.flame else None
+    try:
+        if sampler:
+            sampler.start()
+        if profiler:
+            profiler.enable()
+        move = search.run(validMoves)
+    finally:
+        if profiler:
+            profiler.disable()
+        if sampler:
+            sampler.stop()
+        instrumentation.disable()
+    print("best move %s\n" % (move.getChessNotation() if move else None))
+    print(search.getStats().report())
+    if profiler:
+        profiler.dump_stats(args.profile)
+        print()
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(15)
+    if sampler:
+        sampler.write(args.flame)
+        print("%d stack samples written to %s" % (sum(sampler.samples.values()), args.flame))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""
+Opening book in the Polyglot .bin layout: 16 byte big-endian entries (key, move, weight, learn) sorted by key. The
+file is memory-mapped and searched in place, so a book of any size costs no load time and no memory of its own.
+
+    python -m chess.opening_book build games.pgn -o book.bin --plies 16
+    python -m chess.opening_book probe book.bin "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
+
+Keys are the Polyglot Random64 keys (chess/polyglot.py), so Polyglot books made by other programs can be probed and
+books built here work elsewhere. Moves use the Polyglot encoding: castling is the king taking its own rook, and
+promotions are always to a queen here; book moves that underpromote are skipped.
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+from chess import chess_engine, pgn
+from chess.polyglot import polyglotKey
+
+ENTRY = struct.Struct(">QHHI") #key, move, weight, learn
+MAX_WEIGHT = 0xffff
+QUEEN_PROMOTION = 4
+_ROOK_COLUMNS = {6: 7, 2: 0} #castling king's destination column -> its rook's column
+
+
+'''
+Polyglot move bits: to file 0-2, to rank 3-5, from file 6-8, from rank 9-11, promotion piece 12-14
+'''
+def encodeMove(move):
+    endCol = _ROOK_COLUMNS[move.endCol] if move.isCastleMove else move.endCol
+    polyMove = endCol | (7 - move.endRow) << 3 | move.startCol << 6 | (7 - move.startRow) << 9
+    if move.isPawnPromotion:
+        polyMove |= QUEEN_PROMOTION << 12
+    return polyMove
+
+
+'''
+The legal Move of gs for a Polyglot move, None when there is none (e.g. an underpromotion)
+'''
+def decodeMove(gs, polyMove, validMoves=None):
+    if validMoves is None:
+        validMoves = gs.getValidMoves()
+    promotion = polyMove >> 12 & 7
+    if promotion not in (0, QUEEN_PROMOTION):
+        return None
+    for move in validMoves:
+        if encodeMove(move) == polyMove:
+            return move
+    return None
+
+
+class OpeningBook():
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        if size % ENTRY.size:
+            self.file.close()
+            raise ValueError("%s is not an opening book: size %d is not a multiple of %d" % (path, size, ENTRY.size))
+        self.entries = size // ENTRY.size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.entries
+
+    '''
+    Index of the first entry whose key is not below key
+    '''
+    def lowerBound(self, key):
+        low, high = 0, self.entries
+        while low < high:
+            middle = (low + high) // 2
+            if ENTRY.unpack_from(self.data, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    '''
+    Raw (polyglot move, weight) pairs stored for a Polyglot key
+    '''
+    def entriesFor(self, key):
+        found = []
+        index = self.lowerBound(key)
+        while index < self.entries:
+            entryKey, polyMove, weight, _ = ENTRY.unpack_from(self.data, index * ENTRY.size)
+            if entryKey != key:
+                break
+            found.append((polyMove, weight))
+            index += 1
+        return found
+
+    '''
+    Book moves of the position as (Move, weight), the moves taken from validMoves when they are given
+    '''
+    def findMoves(self, gs, validMoves=None):
+        entries = self.entriesFor(polyglotKey(gs))
+        if not entries:
+            return []
+        if validMoves is None:
+            validMoves = gs.getValidMoves()
+        moves = []
+        for polyMove, weight in entries:
+            move = decodeMove(gs, polyMove, validMoves)
+            if move is not None and weight > 0:
+                moves.append((move, weight))
+        return moves
+
+    '''
+    A book move picked at random in proportion to its weight, None when the position is not in the book
+    '''
+    def pickMove(self, gs, validMoves=None, rng=random):
+        moves = self.findMoves(gs, validMoves)
+        if not moves:
+            return None
+        pick = rng.randrange(sum(weight for _, weight in moves))
+        for move, weight in moves:
+            if pick < weight:
+                return move
+            pick -= weight
+        return moves[-1][0]
+
+
+'''
+Builds a book from PGN files: every position of the first maxPlies plies of every game gets its moves, weighted by
+two points for a win and one for a draw of the side that played them. Returns the number of entries written.
+'''
+def buildBook(pgnFiles, outPath, maxPlies=16, minGames=1, onGame=None):
+    counts = {} #(key, polyglot move) -> [games, points]
+    for path in pgnFiles:
+        with open(path, errors='replace') as f:
+            for game in pgn.readGames(f):
+                points = {'1-0': (2, 0), '0-1': (0, 2), '1/2-1/2': (1, 1)}.get(game.result, (0, 0))
+                try:
+                    for ply, (gs, move) in enumerate(pgn.replay(game)):
+                        if ply >= maxPlies:
+                            break
+                        entry = counts.setdefault((polyglotKey(gs), encodeMove(move)), [0, 0])
+                        entry[0] += 1
+                        entry[1] += points[0 if gs.whiteToMove else 1]
+                except ValueError:
+                    pass #keep the moves up to the first one the engine cannot play
+                if onGame:
+                    onGame(game)
+    entries = [(key, polyMove, games, score) for (key, polyMove), (games, score) in counts.items()
+               if games >= minGames and score > 0]
+    top = max((score for _, _, _, score in entries), default=1)
+    scale = min(1.0, MAX_WEIGHT / top)
+    entries.sort()
+    with open(outPath, 'wb') as f:
+        for key, polyMove, _, score in entries:
+            f.write(ENTRY.pack(key, polyMove, max(1, int(score * scale)), 0))
+    return len(entries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or probe an opening book")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="build a book from PGN files")
+    build.add_argument('pgn', nargs='+')
+    build.add_argument('-o', '--output', default='book.bin')
+    build.add_argument('--plies', type=int, default=16, help="plies of every game to put in the book")
+    build.add_argument('--min-games', type=int, default=1, help="drop moves played in fewer games")
+    probe = commands.add_parser('probe', help="list the book moves of a position")
+    probe.add_argument('book')
+    probe.add_argument('fen', nargs='?', help="position to look up, the start position by default")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        games = [0]
+
+        def onGame(game):
+            games[0] += 1
+            if games[0] % 1000 == 0:
+                sys.stderr.write("%d games\n" % games[0])
+
+        entries = buildBook(args.pgn, args.output, args.plies, args.min_games, onGame)
+        print("%d games, %d entries written to %s" % (games[0], entries, args.output))
+        return 0
+    gs = chess_engine.GameState.fromFEN(args.fen) if args.fen else chess_engine.GameState()
+    with OpeningBook(args.book) as book:
+        moves = book.findMoves(gs)
+        total = sum(weight for _, weight in moves)
+        for move, weight in sorted(moves, key=lambda m: -m[1]):
+            print("%-6s %6d %5.1f%%" % (move.getChessNotation(), weight, 100.0 * weight / total))
+        if not moves:
+            print("position not in book")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
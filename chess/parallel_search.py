@@ -0,0 +1,232 @@
+"""
+Parallel root search on a process pool, so the search is not held to one core by the GIL. Every iteration of the
+iterative deepening splits the root moves over the workers; the best score found so far at the root is shared between
+them, so a worker searches its later moves with the alpha the others have already proven. Each worker keeps its own
+transposition table between iterations and between searches.
+
+With one worker the ordinary serial ChessAI.Search runs in this process, so results are deterministic.
+
+    python -m chess.parallel_search -w 1 2 4 -d 4     speedup and node overhead against the serial search
+"""
+import argparse
+import atexit
+import multiprocessing
+import os
+import sys
+import time
+from chess import chess_engine, ChessAI
+from chess.ChessAI import CHECKMATE, MATE_BOUND, MAX_DEPTH
+
+WORKERS = os.cpu_count() or 1
+
+#set in each worker process by _initWorker
+_sharedAlpha = None
+_stopFlag = None
+_lastSearchId = None
+
+_pools = {} #worker count -> (pool, shared alpha, stop flag), kept alive between searches
+#fresh interpreters instead of forks: a fork made while another thread blocks reading stdin (the UCI loop) hangs
+#when the child closes its copy of stdin
+_context = multiprocessing.get_context("spawn")
+
+
+def _initWorker(sharedAlpha, stopFlag):
+    global _sharedAlpha, _stopFlag
+    _sharedAlpha = sharedAlpha
+    _stopFlag = stopFlag
+
+
+'''
+A Search that also stops when the parent raises the shared stop flag
+'''
+class RootSplitSearch(ChessAI.Search):
+    def checkLimits(self):
+        ChessAI.Search.checkLimits(self)
+        if self.depth and self.nodes & 1023 == 0 and _stopFlag.value:
+            self.stopped = True
+
+
+'''
+Runs in a worker: searches the given root move codes to depth and returns ([(code, score)], nodes, stopped).
+A move that scores no better than the shared alpha only has an upper bound as its score, which is fine for picking the
+best move and for ordering the next iteration.
+'''
+def _searchRootMoves(gs, codes, depth, secondsLeft, searchId):
+    global _lastSearchId
+    if searchId != _lastSearchId:
+        ChessAI.transpositionTable.newSearch()
+        _lastSearchId = searchId
+    search = RootSplitSearch(gs)
+    search.depth = depth - 1 #lets the budget stop any iteration but the first
+    search.deadline = time.perf_counter() + secondsLeft if secondsLeft is not None else None
+    beta = CHECKMATE + 1
+    results = []
+    for code in codes:
+        alpha = _sharedAlpha.value
+        gs.makeMoveCode(code)
+        score = -search.negamax(depth - 1, -beta, -alpha, 1)
+        gs.undoMoveCode()
+        if search.stopped:
+            break
+        results.append((code, score))
+        if score > alpha:
+            with _sharedAlpha.get_lock():
+                if score > _sharedAlpha.value:
+                    _sharedAlpha.value = score
+    return results, search.nodes, search.stopped
+
+
+def _getPool(workers):
+    if workers not in _pools:
+        sharedAlpha = _context.Value('q', 0)
+        stopFlag = _context.Value('b', 0)
+        pool = _context.Pool(workers, initializer=_initWorker, initargs=(sharedAlpha, stopFlag))
+        _pools[workers] = (pool, sharedAlpha, stopFlag)
+    return _pools[workers]
+
+
+'''
+Stops the worker processes, the next parallel search starts new ones
+'''
+def shutdown():
+    for pool, sharedAlpha, stopFlag in _pools.values():
+        pool.terminate()
+        pool.join()
+    _pools.clear()
+
+
+atexit.register(shutdown)
+
+
+'''
+Same interface and result attributes as ChessAI.Search (nodes, depth, bestMove, bestScore), with a worker count
+'''
+class ParallelSearch():
+    _searchCount = 0
+
+    def __init__(self, gs, workers=WORKERS, timeLimit=None, maxDepth=MAX_DEPTH):
+        self.gs = gs
+        self.workers = max(1, workers)
+        self.timeLimit = timeLimit
+        self.maxDepth = maxDepth
+        self.nodes = 0
+        self.depth = 0
+        self.bestMove = None
+        self.bestCode = 0
+        self.bestScore = 0
+        self.stopped = False
+        self.stopFlag = None
+        self.serial = None #the in-process search when there is only one worker
+        self.onIteration = None #called with the search after every finished iteration
+
+    def run(self, validMoves):
+        if self.workers == 1:
+            self.serial = search = ChessAI.Search(self.gs, self.timeLimit, maxDepth=self.maxDepth)
+            if self.onIteration is not None:
+                search.onIteration = self.serialIteration
+            if self.stopped:
+                search.stop()
+            self.bestMove = search.run(validMoves)
+            self.nodes, self.depth, self.bestScore = search.nodes, search.depth, search.bestScore
+            self.bestCode = search.bestCode
+            return self.bestMove
+        if not validMoves:
+            return None
+        ParallelSearch._searchCount += 1
+        searchId = (os.getpid(), ParallelSearch._searchCount)
+        pool, sharedAlpha, stopFlag = _getPool(self.workers)
+        self.stopFlag = stopFlag
+        deadline = time.time() + self.timeLimit if self.timeLimit is not None else None
+        rootMoves = [move.code for move in validMoves]
+        bestCode = rootMoves[0]
+        for depth in range(1, self.maxDepth + 1):
+            sharedAlpha.value = -CHECKMATE - 1
+            stopFlag.value = 0
+            if self.stopped:
+                break
+            secondsLeft = max(0.0, deadline - time.time()) if deadline is not None else None
+            #round robin, so the best move of the last iteration goes first to the first worker
+            chunks = [rootMoves[i::self.workers] for i in range(self.workers)]
+            tasks = [pool.apply_async(_searchRootMoves, (self.gs, chunk, depth, secondsLeft, searchId))
+                     for chunk in chunks if chunk]
+            scores = []
+            stopped = False
+            for task in tasks:
+                results, nodes, taskStopped = task.get()
+                scores += results
+                self.nodes += nodes
+                if taskStopped:
+                    stopFlag.value = 1 #the others are out of time as well, do not wait for them
+                    stopped = True
+            if stopped or self.stopped:
+                break
+            scores.sort(key=lambda result: result[1], reverse=True)
+            rootMoves = [code for code, score in scores]
+            bestCode, self.bestScore = scores[0]
+            self.bestCode = bestCode
+            self.depth = depth
+            if self.onIteration is not None:
+                self.onIteration(self)
+            if abs(self.bestScore) > MATE_BOUND:
+                break
+            if deadline is not None and time.time() >= deadline:
+                break
+        self.bestMove = next(move for move in validMoves if move.code == bestCode)
+        return self.bestMove
+
+    def serialIteration(self, search):
+        self.nodes, self.depth, self.bestScore, self.bestCode = search.nodes, search.depth, search.bestScore, search.bestCode
+        self.onIteration(self)
+
+    '''
+    Asks the search to stop, safe to call from another thread
+    '''
+    def stop(self):
+        self.stopped = True
+        if self.serial is not None:
+            self.serial.stop()
+        if self.stopFlag is not None:
+            self.stopFlag.value = 1
+
+
+BENCHMARK_POSITIONS = ["kiwipete", "middlegame", "promotion-castling"]
+
+
+'''
+Searches each benchmark position to a fixed depth serially and with each worker count, and prints time, nodes,
+speedup (serial time / parallel time) and search overhead (extra nodes the parallel search needed)
+'''
+def main(argv=None):
+    from chess import perft
+    from chess.transposition_table import TranspositionTable
+    parser = argparse.ArgumentParser(description="Compare the parallel root search with the serial search")
+    parser.add_argument('-w', '--workers', type=int, nargs='+', default=[WORKERS], help="worker counts to measure")
+    parser.add_argument('-d', '--depth', type=int, default=4, help="fixed search depth")
+    args = parser.parse_args(argv)
+
+    fens = {name: fen for name, fen, expected, depth in perft.POSITIONS}
+    for name in BENCHMARK_POSITIONS:
+        gs = chess_engine.GameState.fromFEN(fens[name])
+        serial = ChessAI.Search(gs, maxDepth=args.depth, table=TranspositionTable())
+        start = time.perf_counter()
+        move = serial.run(gs.getValidMoves())
+        serialSeconds = time.perf_counter() - start
+        print("%-20s serial     %s %6d %8d nodes %7.2fs" % (name, move.getChessNotation(), serial.bestScore,
+                                                             serial.nodes, serialSeconds))
+        for workers in args.workers:
+            shutdown() #fresh workers and tables, so no run starts with a warm table
+            ChessAI.transpositionTable.clear()
+            search = ParallelSearch(gs, workers, maxDepth=args.depth)
+            _getPool(workers)
+            start = time.perf_counter()
+            move = search.run(gs.getValidMoves())
+            seconds = time.perf_counter() - start
+            print("%-20s %2d workers %s %6d %8d nodes %7.2fs  speedup x%.2f  overhead %+.0f%%" % (
+                name, workers, move.getChessNotation(), search.bestScore, search.nodes, seconds,
+                serialSeconds / seconds, 100.0 * (search.nodes / serial.nodes - 1)))
+    shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
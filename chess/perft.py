@@ -0,0 +1,162 @@
+"""
+Perft: counts the leaf nodes of the legal move tree to a fixed depth and compares them with known counts, to test
+GameState.getValidMoves for correctness and to benchmark it. Runs headless, without pygame:
+
+    python -m chess.perft                       run the whole suite to each position's default depth
+    python -m chess.perft -p kiwipete -d 3      one position, one depth
+    python -m chess.perft -p start -d 3 --divide
+    python -m chess.perft --json results.json   also write the results for comparing runs across commits
+    python -m chess.perft --compare old.json    print the speed change against an earlier results file
+
+The engine always promotes to a queen, so counts for positions with promotions differ from the published ones (which
+count all four promotion pieces). Those counts were checked against an independent queen-only move generator.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from chess import chess_engine
+
+'''
+(name, FEN, expected leaf counts for depth 1, 2, ..., default depth for the suite)
+'''
+POSITIONS = [
+    ("start", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", [20, 400, 8902, 197281, 4865609], 4),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4074224], 3),
+    ("enpassant", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238, 674624], 4),
+    ("promotion", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 228, 8087], 3),
+    ("promotion-castling", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [41, 1373, 54007], 3),
+    ("middlegame", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", [46, 2079, 89890], 3),
+    ("castling", "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", [26, 568, 13744], 3),
+    ("rook-captured", "4k3/8/8/8/8/8/6b1/4K2R b K - 0 1", [14, 179, 2454], 3),
+    ("enpassant-pinned", "8/8/8/8/k2Pp2Q/8/8/3K4 b - d3 0 1", [6, 136, 863], 3),
+    ("enpassant-evasion", "8/8/8/2k5/2pP4/8/B7/4K3 b - d3 0 1", [8, 72, 492], 3),
+    ("stalemate", "k7/8/1Q6/8/8/8/8/7K b - - 0 1", [0], 1),
+]
+
+
+class PerftCounter():
+    def __init__(self):
+        self.flagErrors = [] #positions without legal moves where neither checkmate nor stalemate got set
+        self.buffers = [[] for ply in range(64)] #one reused move list per ply
+
+    '''
+    Number of leaf nodes depth plies below the current position. Runs on packed move codes like the search does.
+    '''
+    def perft(self, gs, depth, ply=0):
+        moves = self.buffers[ply]
+        moves.clear()
+        if not gs.generateLegalMoves(moves):
+            gs.getValidMoves() #sets the checkmate and stalemate flags
+            self.checkTerminalFlags(gs)
+            return 0
+        if depth == 1:
+            return len(moves)
+        nodes = 0
+        for code in moves:
+            gs.makeMoveCode(code)
+            nodes += self.perft(gs, depth - 1, ply + 1)
+            gs.undoMoveCode()
+        return nodes
+
+    '''
+    Leaf counts below each root move
+    '''
+    def divide(self, gs, depth):
+        counts = []
+        for move in gs.getValidMoves():
+            gs.makeMove(move)
+            counts.append((move.getChessNotation(), self.perft(gs, depth - 1, 1) if depth > 1 else 1))
+            gs.undoMove(move)
+        return counts
+
+    def checkTerminalFlags(self, gs):
+        inCheck = gs.inCheck()
+        if gs.checkmate != inCheck or gs.stalemate == inCheck:
+            self.flagErrors.append({'checkmate': gs.checkmate, 'stalemate': gs.stalemate, 'inCheck': inCheck,
+                                    'moves': [chess_engine.Move.fromCode(code).getChessNotation()
+                                              for code in gs.moveStack]})
+
+
+def runPosition(name, fen, expected, depth):
+    counter = PerftCounter()
+    gs = chess_engine.GameState.fromFEN(fen)
+    start = time.perf_counter()
+    nodes = counter.perft(gs, depth) if depth > 0 else 1
+    seconds = time.perf_counter() - start
+    expectedNodes = expected[depth - 1] if 0 < depth <= len(expected) else None
+    return {'name': name, 'fen': fen, 'depth': depth, 'nodes': nodes, 'expected': expectedNodes,
+            'ok': (expectedNodes is None or nodes == expectedNodes) and not counter.flagErrors,
+            'flagErrors': counter.flagErrors[:10], 'seconds': round(seconds, 4),
+            'nps': int(nodes / seconds) if seconds > 0 else 0}
+
+
+def gitRevision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compareResults(results, oldFile):
+    with open(oldFile) as f:
+        old = {(r['name'], r['depth']): r for r in json.load(f)['results']}
+    for result in results:
+        before = old.get((result['name'], result['depth']))
+        if before and before['nps']:
+            print("%-20s depth %d  %9d nps -> %9d nps  (x%.2f)" % (result['name'], result['depth'], before['nps'],
+                                                                   result['nps'], result['nps'] / before['nps']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft correctness and speed suite for chess_engine.GameState")
+    parser.add_argument('-p', '--position', help="name of one suite position, or a FEN string")
+    parser.add_argument('-d', '--depth', type=int, help="depth to count to (default: each position's suite depth)")
+    parser.add_argument('--divide', action='store_true', help="print the leaf count below every root move")
+    parser.add_argument('--json', help="write the results to this file")
+    parser.add_argument('--compare', help="results file of an earlier run to compare speed against")
+    args = parser.parse_args(argv)
+
+    positions = POSITIONS
+    if args.position:
+        positions = [p for p in POSITIONS if p[0] == args.position]
+        if not positions:
+            positions = [("custom", args.position, [], 3)]
+
+    if args.divide:
+        name, fen, expected, suiteDepth = positions[0]
+        depth = args.depth or suiteDepth
+        counts = PerftCounter().divide(chess_engine.GameState.fromFEN(fen), depth)
+        for notation, nodes in counts:
+            print("%s: %d" % (notation, nodes))
+        print("\nMoves: %d\nNodes: %d" % (len(counts), sum(nodes for notation, nodes in counts)))
+        return 0
+
+    results = []
+    for name, fen, expected, suiteDepth in positions:
+        result = runPosition(name, fen, expected, args.depth or suiteDepth)
+        results.append(result)
+        status = "ok" if result['ok'] else "FAILED (expected %s)" % result['expected']
+        if result['flagErrors']:
+            status += ", checkmate/stalemate flags wrong in %d positions" % len(result['flagErrors'])
+        print("%-20s depth %d %10d nodes %8.2fs %9d nps  %s" % (name, result['depth'], result['nodes'],
+                                                                result['seconds'], result['nps'], status))
+    totalNodes = sum(r['nodes'] for r in results)
+    totalSeconds = sum(r['seconds'] for r in results)
+    print("total %d nodes in %.2fs, %d nps" % (totalNodes, totalSeconds, totalNodes / totalSeconds if totalSeconds else 0))
+
+    if args.compare:
+        compareResults(results, args.compare)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'revision': gitRevision(), 'python': platform.python_version(), 'time': time.time(),
+                       'results': results}, f, indent=1)
+    return 0 if all(r['ok'] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
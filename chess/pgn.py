@@ -0,0 +1,186 @@
+"""
+Streaming PGN reading and SAN (standard algebraic notation) conversion. Games are read one at a time, so collections
+of any size go through in constant memory.
+
+The engine only promotes to a queen, so moves that underpromote cannot be played here; moveFromSAN raises ValueError
+for them like for any other move that is not legal in the position.
+"""
+import re
+from chess import chess_engine
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+_HEADER = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_MOVE_NUMBER = re.compile(r'^\d+\.+')
+_SAN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+
+
+class Game():
+    def __init__(self, headers, moves):
+        self.headers = headers #tag pairs, e.g. {'White': ..., 'Result': '1-0'}
+        self.moves = moves #SAN strings, without comments, variations or move numbers
+
+    @property
+    def result(self):
+        return self.headers.get('Result', '*')
+
+    '''
+    The starting GameState of the game, from its FEN tag when it has one
+    '''
+    def startPosition(self):
+        if 'FEN' in self.headers:
+            return chess_engine.GameState.fromFEN(self.headers['FEN'])
+        return chess_engine.GameState()
+
+
+'''
+Splits movetext into tokens, dropping comments, variations, NAGs and move numbers
+'''
+def tokenize(text, state):
+    tokens = []
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if state['comment']: #inside {...}, which may span lines
+            end = text.find('}', i)
+            if end < 0:
+                return tokens
+            state['comment'] = False
+            i = end + 1
+        elif ch == '{':
+            state['comment'] = True
+            i += 1
+        elif ch == ';':
+            return tokens #comment to the end of the line
+        elif ch == '(':
+            state['variation'] += 1
+            i += 1
+        elif ch == ')':
+            state['variation'] = max(0, state['variation'] - 1)
+            i += 1
+        elif ch.isspace():
+            i += 1
+        else:
+            j = i
+            while j < len(text) and not text[j].isspace() and text[j] not in '{};()':
+                j += 1
+            token = _MOVE_NUMBER.sub('', text[i:j])
+            if token and not state['variation'] and not token.startswith('$'):
+                tokens.append(token)
+            i = j
+    return tokens
+
+
+'''
+Yields the games of a PGN file (any iterable of lines) one at a time
+'''
+def readGames(lines):
+    headers = {}
+    moves = []
+    state = {'comment': False, 'variation': 0}
+    inMoves = False
+    for line in lines:
+        stripped = line.strip()
+        if not state['comment'] and stripped.startswith('['):
+            if inMoves: #a new game starts without a result token ending the last one
+                yield Game(headers, moves)
+                headers, moves, inMoves = {}, [], False
+            match = _HEADER.match(stripped)
+            if match:
+                headers[match.group(1)] = match.group(2).replace('\\"', '"')
+            continue
+        if stripped.startswith('%'):
+            continue #escape line
+        for token in tokenize(line, state):
+            if token in RESULTS:
+                headers.setdefault('Result', token)
+                yield Game(headers, moves)
+                headers, moves, inMoves = {}, [], False
+                state = {'comment': False, 'variation': 0}
+            else:
+                moves.append(token)
+                inMoves = True
+    if inMoves or headers:
+        yield Game(headers, moves)
+
+
+'''
+The legal Move of gs that a SAN string stands for; raises ValueError when there is none or it is ambiguous
+'''
+def moveFromSAN(gs, san, validMoves=None):
+    text = san.rstrip('+#!?')
+    if validMoves is None:
+        validMoves = gs.getValidMoves()
+    if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        kingSide = text.count('O') + text.count('0') == 2
+        for move in validMoves:
+            if move.isCastleMove and (move.endCol > move.startCol) == kingSide:
+                return move
+        raise ValueError("castling %s is not legal here" % san)
+    match = _SAN.match(text)
+    if not match:
+        raise ValueError("cannot read move %r" % san)
+    piece, fromFile, fromRank, to, promotion = match.groups()
+    if promotion and promotion != 'Q':
+        raise ValueError("underpromotion %s is not supported" % san)
+    piece = piece or 'P'
+    endRow = chess_engine.Move.ranksToRows[to[1]]
+    endCol = chess_engine.Move.filesToCols[to[0]]
+    candidates = []
+    for move in validMoves:
+        if (move.endRow != endRow or move.endCol != endCol or move.pieceMoved[1] != piece or move.isCastleMove
+                or (fromFile and move.startCol != chess_engine.Move.filesToCols[fromFile])
+                or (fromRank and move.startRow != chess_engine.Move.ranksToRows[fromRank])):
+            continue
+        candidates.append(move)
+    if len(candidates) != 1:
+        raise ValueError("move %s is %s here" % (san, "ambiguous" if candidates else "not legal"))
+    return candidates[0]
+
+
+'''
+SAN for a legal move of gs, e.g. Nbd7, exd6, O-O, e8=Q+
+'''
+def moveToSAN(gs, move, validMoves=None):
+    if validMoves is None:
+        validMoves = gs.getValidMoves()
+    if move.isCastleMove:
+        san = 'O-O' if move.endCol > move.startCol else 'O-O-O'
+    else:
+        piece = move.pieceMoved[1]
+        capture = move.pieceCaptured != '--'
+        target = move.getRankFile(move.endRow, move.endCol)
+        if piece == 'P':
+            san = (move.getRankFile(move.startRow, move.startCol)[0] + 'x' if capture else '') + target
+            if move.isPawnPromotion:
+                san += '=Q'
+        else:
+            others = [m for m in validMoves if m.pieceMoved == move.pieceMoved and m.endSquare == move.endSquare
+                      and m.startSquare != move.startSquare]
+            disambiguation = ''
+            if others:
+                square = move.getRankFile(move.startRow, move.startCol)
+                if all(m.startCol != move.startCol for m in others):
+                    disambiguation = square[0]
+                elif all(m.startRow != move.startRow for m in others):
+                    disambiguation = square[1]
+                else:
+                    disambiguation = square
+            san = piece + disambiguation + ('x' if capture else '') + target
+    gs.makeMove(move)
+    replies = gs.getValidMoves()
+    if gs.inCheck():
+        san += '#' if not replies else '+'
+    gs.undoMove(move)
+    return san
+
+
+'''
+Replays a game and yields (GameState before the move, Move) for every move; the GameState is the same object each time
+and moves on after the caller is done with it. Stops with ValueError at the first move that cannot be played.
+'''
+def replay(game):
+    gs = game.startPosition()
+    for san in game.moves:
+        move = moveFromSAN(gs, san)
+        yield gs, move
+        gs.makeMove(move)
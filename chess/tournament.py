@@ -0,0 +1,245 @@
+"""
+Headless engine against engine matches, to check that engine changes turn into playing strength. Games run on a
+process pool; every opening is played twice with the colours swapped, and the result is reported as an Elo difference
+with a 95% error margin, together with the nodes per second each engine searched.
+
+    python -m chess.tournament search:time=0.1 minmax
+    python -m chess.tournament search:depth=3 search:depth=2 -g 200 -w 8 --openings chess/openings.txt
+
+Engines are given as a name with optional settings:
+    random                  ChessAI.findRandomMove
+    greedy                  ChessAI.findBestMove, two plies of material
+    minmax                  ChessAI.findBestMoveMinMax, minimax to ChessAI.DEPTH
+    search:time=0.2         ChessAI.Search, with any of time=<seconds>, depth=<plies>, nodes=<count>, hash=<MB>
+
+Games are adjudicated as draws on threefold repetition, the fifty move rule, insufficient material or the ply limit,
+and as wins once a search engine reports a forced mate for the side to move.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from chess import chess_engine, ChessAI
+from chess.transposition_table import TranspositionTable
+
+DEFAULT_OPENINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "openings.txt")
+MAX_PLIES = 300 #games still going after this many plies are drawn
+DRAW_REASONS = {chess_engine.STALEMATE: "stalemate", chess_engine.FIFTY_MOVES: "fifty move rule",
+                chess_engine.REPETITION: "threefold repetition"}
+
+
+class Engine():
+    def __init__(self, spec):
+        self.spec = spec
+        name, _, settings = spec.partition(':')
+        self.name = name
+        self.options = {}
+        for setting in filter(None, settings.split(',')):
+            key, _, value = setting.partition('=')
+            self.options[key] = float(value) if key == 'time' else int(value)
+        if name not in ('random', 'greedy', 'minmax', 'search'):
+            raise ValueError("unknown engine %r" % spec)
+        unknown = set(self.options) - {'time', 'depth', 'nodes', 'hash'}
+        if unknown:
+            raise ValueError("unknown engine settings %s in %r" % (sorted(unknown), spec))
+        if name == 'search' and not {'time', 'depth', 'nodes'} & set(self.options):
+            self.options['time'] = ChessAI.TIME_LIMIT
+        self.table = None
+
+    def newGame(self):
+        if self.name == 'search':
+            self.table = TranspositionTable(self.options.get('hash', 4))
+        elif self.name == 'minmax':
+            ChessAI.minMaxTable.clear()
+
+    '''
+    Returns (move, nodes searched, score for the side to move or None when the engine does not tell)
+    '''
+    def pickMove(self, gs, validMoves):
+        if self.name == 'random':
+            return ChessAI.findRandomMove(validMoves), 0, None
+        if self.name == 'greedy':
+            move = ChessAI.findBestMove(gs, list(validMoves))
+            return move, ChessAI.nodeCounts['main'], None
+        if self.name == 'minmax':
+            move = ChessAI.findBestMoveMinMax(gs, validMoves)
+            return move, ChessAI.nodeCounts['main'] + ChessAI.nodeCounts['quiescence'], None
+        search = ChessAI.Search(gs, self.options.get('time'), self.options.get('nodes'),
+                                self.options.get('depth', ChessAI.MAX_DEPTH), self.table)
+        return search.run(validMoves), search.nodes, search.bestScore
+
+
+'''
+Sets up the position of an opening line: a FEN string, or moves from the start position
+'''
+def openingPosition(opening):
+    if '/' in opening:
+        return chess_engine.GameState.fromFEN(opening)
+    gs = chess_engine.GameState()
+    for notation in opening.split():
+        moves = [move for move in gs.getValidMoves() if move.getChessNotation() == notation]
+        if not moves:
+            raise ValueError("illegal move %s in opening %r" % (notation, opening))
+        gs.makeMove(moves[0])
+    return gs
+
+
+def readOpenings(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+#only kings, or kings and a single knight or bishop
+def insufficientMaterial(gs):
+    bitboards = gs.pieceBitboards
+    if any(bitboards[i] for i in (0, 3, 4, 6, 9, 10)): #pawns, rooks, queens
+        return False
+    minors = bitboards[1] | bitboards[2] | bitboards[7] | bitboards[8]
+    return minors & (minors - 1) == 0
+
+
+'''
+Plays one game and returns its record. The result is from white's point of view: 1, 0.5 or 0.
+'''
+def playGame(game):
+    index, opening, whiteSpec, blackSpec, maxPlies = game
+    random.seed(index) #the random and greedy engines play the same game every run
+    engines = [Engine(whiteSpec), Engine(blackSpec)]
+    for engine in engines:
+        engine.newGame()
+    gs = openingPosition(opening)
+    nodes = [0, 0]
+    seconds = [0.0, 0.0]
+    plies = 0
+    result = reason = None
+    while result is None:
+        validMoves = gs.getValidMoves()
+        status = gs.gameStatus()
+        if status == chess_engine.CHECKMATE:
+            result, reason = (0 if gs.whiteToMove else 1), "checkmate"
+            break
+        if status != chess_engine.ONGOING:
+            result, reason = 0.5, DRAW_REASONS[status]
+            break
+        side = 0 if gs.whiteToMove else 1
+        start = time.perf_counter()
+        move, searched, score = engines[side].pickMove(gs, validMoves)
+        seconds[side] += time.perf_counter() - start
+        nodes[side] += searched
+        if move is None:
+            move = ChessAI.findRandomMove(validMoves)
+        if score is not None and score > ChessAI.MATE_BOUND:
+            result, reason = (1 if side == 0 else 0), "mate adjudicated"
+            break
+        gs.makeMove(move)
+        plies += 1
+        if insufficientMaterial(gs):
+            result, reason = 0.5, "insufficient material"
+        elif plies >= maxPlies:
+            result, reason = 0.5, "ply limit"
+    return {'game': index, 'opening': opening, 'white': whiteSpec, 'black': blackSpec, 'result': result,
+            'reason': reason, 'plies': plies, 'nodes': nodes, 'seconds': [round(s, 3) for s in seconds],
+            'nps': [int(n / s) if s > 0 else 0 for n, s in zip(nodes, seconds)]}
+
+
+def eloFromScore(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return 0.0 - 400 * math.log10(1 / score - 1)
+
+
+'''
+Elo difference of the first engine and the half width of its 95% confidence interval, from per-game scores.
+A score of 0% or 100% says nothing about how large the difference is: it comes back infinite, with an unbounded
+error. When every game was drawn the scores have no variance, so the margin is that of a Wilson interval instead.
+'''
+def eloDifference(scores):
+    n = len(scores)
+    mean = sum(scores) / n
+    if mean in (0, 1):
+        return (math.inf if mean else -math.inf), math.inf
+    variance = sum((s - mean) ** 2 for s in scores) / n
+    if variance:
+        margin = 1.96 * math.sqrt(variance / n)
+    else:
+        z = 1.96
+        margin = z * math.sqrt(mean * (1 - mean) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    elo = eloFromScore(mean)
+    error = (eloFromScore(mean + margin) - eloFromScore(mean - margin)) / 2
+    return elo, error
+
+
+def runTournament(engineA, engineB, games, openings, workers, maxPlies=MAX_PLIES, onGame=None):
+    schedule = []
+    for index in range(games):
+        opening = openings[(index // 2) % len(openings)]
+        if index % 2 == 0:
+            schedule.append((index, opening, engineA, engineB, maxPlies))
+        else:
+            schedule.append((index, opening, engineB, engineA, maxPlies))
+    records = []
+    with ProcessPoolExecutor(workers) as pool:
+        for record in pool.map(playGame, schedule):
+            records.append(record)
+            if onGame:
+                onGame(record)
+    return records
+
+
+'''
+Totals from engineA's point of view. runTournament gives engineA white in the even games, so the sides are told
+apart by game number, which also works when an engine plays itself.
+'''
+def summarize(records):
+    scores = []
+    nodes = [0, 0]
+    seconds = [0.0, 0.0]
+    for record in records:
+        side = record['game'] % 2 #engineA's colour in this game
+        scores.append(record['result'] if side == 0 else 1 - record['result'])
+        nodes[0] += record['nodes'][side]
+        nodes[1] += record['nodes'][1 - side]
+        seconds[0] += record['seconds'][side]
+        seconds[1] += record['seconds'][1 - side]
+    elo, error = eloDifference(scores)
+    return {'games': len(scores), 'wins': scores.count(1), 'draws': scores.count(0.5), 'losses': scores.count(0),
+            'score': sum(scores) / len(scores), 'elo': elo, 'error': error,
+            'nps': [int(n / s) if s > 0 else 0 for n, s in zip(nodes, seconds)]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play engine against engine matches without the pygame window")
+    parser.add_argument('engineA')
+    parser.add_argument('engineB')
+    parser.add_argument('-g', '--games', type=int, default=100)
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--openings', default=DEFAULT_OPENINGS, help="file with one opening per line")
+    parser.add_argument('--max-plies', type=int, default=MAX_PLIES)
+    parser.add_argument('--json', help="write every game record and the summary to this file")
+    args = parser.parse_args(argv)
+    engineA = Engine(args.engineA).spec #fails early on a bad spec
+    engineB = Engine(args.engineB).spec
+
+    def onGame(record):
+        print("game %4d  %-22s %-22s %-4s %-22s %3d plies  nps %s" % (
+            record['game'] + 1, record['white'], record['black'], {1: '1-0', 0: '0-1', 0.5: '1/2'}[record['result']],
+            record['reason'], record['plies'], record['nps']))
+
+    records = runTournament(engineA, engineB, args.games, readOpenings(args.openings), args.workers, args.max_plies,
+                            onGame)
+    summary = summarize(records)
+    print("\n%s vs %s: +%d =%d -%d  score %.3f  Elo %+.1f +/- %.1f" % (
+        engineA, engineB, summary['wins'], summary['draws'], summary['losses'], summary['score'], summary['elo'],
+        summary['error']))
+    print("nodes per second: %s %d, %s %d" % (engineA, summary['nps'][0], engineB, summary['nps'][1]))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'summary': summary, 'games': records}, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
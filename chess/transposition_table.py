@@ -0,0 +1,108 @@
+"""
+Fixed size transposition table for the search, keyed by GameState.zobristKey. The memory is allocated once from a
+budget in MB, and the table stays alive between moves so later searches can reuse what earlier ones found.
+"""
+from array import array
+
+DEFAULT_SIZE_MB = 16
+
+#what the stored score means relative to the real value of the position
+EXACT = 0
+LOWER_BOUND = 1 #the search failed high, the real score is at least this
+UPPER_BOUND = 2 #the search failed low, the real score is at most this
+
+NO_MOVE = 0
+ENTRY_BYTES = 16 #one 64 bit key plus one 64 bit data word
+
+#layout of the data word
+_SCORE_SHIFT = 16
+_SCORE_OFFSET = 1 << 31 #scores are stored unsigned
+_DEPTH_SHIFT = 48
+_BOUND_SHIFT = 56
+_AGE_SHIFT = 58
+_AGE_MASK = 0x3f
+
+
+'''
+Every bucket holds two entries. The first one is depth-preferred: it is only replaced by a search that went at least
+as deep, or when it is left over from an earlier search. The second one is always replaced, so recent positions
+are kept even when the first slot is guarding a deep result.
+'''
+class TranspositionTable():
+    def __init__(self, sizeMB=DEFAULT_SIZE_MB):
+        self.resize(sizeMB)
+
+    def resize(self, sizeMB):
+        entries = max(2, int(sizeMB * 1024 * 1024) // ENTRY_BYTES)
+        buckets = 1
+        while buckets * 4 <= entries: #largest power of two number of buckets that fits the budget
+            buckets *= 2
+        self.sizeMB = sizeMB
+        self.bucketMask = buckets - 1
+        self.keys = array('Q', bytes(8 * 2 * buckets))
+        self.data = array('Q', bytes(8 * 2 * buckets))
+        self.age = 0
+        self.resetStats()
+
+    '''
+    Forgets every stored position, e.g. when a new game starts
+    '''
+    def clear(self):
+        size = len(self.keys)
+        self.keys = array('Q', bytes(8 * size))
+        self.data = array('Q', bytes(8 * size))
+        self.age = 0
+        self.resetStats()
+
+    '''
+    Marks the start of a new search so entries from older searches become the first to be replaced
+    '''
+    def newSearch(self):
+        self.age = (self.age + 1) & _AGE_MASK
+
+    def resetStats(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.collisions = 0 #stores that evicted a different position
+
+    def getStats(self):
+        return {'sizeMB': self.sizeMB, 'entries': len(self.keys), 'probes': self.probes, 'hits': self.hits,
+                'stores': self.stores, 'collisions': self.collisions}
+
+    '''
+    Returns (depth, score, bound, move) stored for the position with this key, or None
+    '''
+    def probe(self, key):
+        self.probes += 1
+        index = (key & self.bucketMask) << 1
+        keys = self.keys
+        if keys[index] != key:
+            index += 1
+            if keys[index] != key:
+                return None
+        data = self.data[index]
+        if not data:
+            return None
+        self.hits += 1
+        return ((data >> _DEPTH_SHIFT) & 0xff, ((data >> _SCORE_SHIFT) & 0xffffffff) - _SCORE_OFFSET,
+                (data >> _BOUND_SHIFT) & 3, data & 0xffff)
+
+    def store(self, key, depth, score, bound, move=NO_MOVE):
+        self.stores += 1
+        index = (key & self.bucketMask) << 1
+        keys = self.keys
+        data = self.data
+        old = data[index]
+        #the depth-preferred slot takes the entry if it is the same position, older, or not deeper
+        if (keys[index] != key and old and ((old >> _AGE_SHIFT) & _AGE_MASK) == self.age
+                and (old >> _DEPTH_SHIFT) & 0xff > depth):
+            index += 1
+            old = data[index]
+        if old and keys[index] != key:
+            self.collisions += 1
+        elif old and move == NO_MOVE:
+            move = old & 0xffff #keep the best move we already knew for this position
+        keys[index] = key
+        data[index] = (self.age << _AGE_SHIFT | bound << _BOUND_SHIFT | max(0, min(depth, 0xff)) << _DEPTH_SHIFT
+                       | (score + _SCORE_OFFSET) << _SCORE_SHIFT | move)
@@ -0,0 +1,285 @@
+"""
+UCI front end, so the engine can run under chess GUIs and match tools:
+
+    python -m chess.uci
+
+Commands are read on the main thread while the search runs on a worker thread, so "stop", "isready" and "quit" are
+answered straight away; stop takes effect at the search's next node. Supported: uci, isready, ucinewgame,
+setoption (Hash, Threads), position startpos|fen ... [moves ...], go (depth, movetime, nodes, wtime, btime, winc,
+binc, movestogo, infinite, ponder), ponderhit, stop, quit. With OwnBook on and a BookFile set, positions in the
+opening book are answered from it without searching.
+"""
+import sys
+import threading
+import time
+from chess import chess_engine, ChessAI
+from chess.ChessAI import CHECKMATE, MATE_BOUND
+from chess.parallel_search import ParallelSearch, shutdown
+
+ENGINE_NAME = "Chess"
+ENGINE_AUTHOR = "Utkrist135"
+MAX_THREADS = 64
+MOVE_OVERHEAD = 0.05 #seconds kept back from every move for the GUI and the pipe
+GO_KEYWORDS = {"searchmoves", "ponder", "wtime", "btime", "winc", "binc", "movestogo", "depth", "nodes", "mate",
+               "movetime", "infinite"}
+
+
+'''
+Moves go over the wire as start and end square, plus the promotion piece, which is always a queen here
+'''
+def uciMove(move):
+    return move.getChessNotation() + ('q' if move.isPawnPromotion else '')
+
+
+def findMove(gs, text):
+    for move in gs.getValidMoves():
+        if uciMove(move) == text or move.getChessNotation() == text:
+            return move
+    return None
+
+
+'''
+UCI score text for a side-to-move score: centipawns, or mate in moves (negative when getting mated)
+'''
+def scoreText(score):
+    if score > MATE_BOUND:
+        return "mate %d" % ((CHECKMATE - score + 1) // 2)
+    if score < -MATE_BOUND:
+        return "mate -%d" % ((CHECKMATE + score + 1) // 2)
+    return "cp %d" % score
+
+
+'''
+Seconds to spend on a move from the go command's clock: a share of the time left plus most of the increment,
+never more than half the clock
+'''
+def timeBudget(timeLeft, increment, movesToGo):
+    budget = timeLeft / (movesToGo or 30) + increment * 0.8
+    return max(0.01, min(budget, timeLeft * 0.5) - MOVE_OVERHEAD)
+
+
+class UCIEngine():
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.outputLock = threading.Lock()
+        self.gs = chess_engine.GameState()
+        self.threads = 1
+        self.search = None
+        self.thread = None
+        self.ponderBudget = None #time budget to start counting on ponderhit
+        self.ponderTimer = None
+        self.waitForStop = threading.Event() #set once the GUI allows bestmove after infinite or ponder searches
+        self.searchStart = 0.0
+        self.lastPV = [] #principal variation of the last finished iteration, its second move is the ponder move
+        self.ownBook = True
+        self.searchMoves = set() #root moves of the last go searchmoves in UCI notation, empty for all of them
+
+    def send(self, line):
+        with self.outputLock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    '''
+    Handles one command line, returns False on quit
+    '''
+    def handle(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send("id name %s" % ENGINE_NAME)
+            self.send("id author %s" % ENGINE_AUTHOR)
+            self.send("option name Hash type spin default %d min 1 max 4096" % ChessAI.transpositionTable.sizeMB)
+            self.send("option name Threads type spin default 1 min 1 max %d" % MAX_THREADS)
+            self.send("option name Ponder type check default false")
+            self.send("option name OwnBook type check default true")
+            self.send("option name BookFile type string default %s" % (
+                ChessAI.openingBook.path if ChessAI.openingBook is not None else "<empty>"))
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stopSearch()
+            ChessAI.transpositionTable.clear()
+            self.gs = chess_engine.GameState()
+        elif command == "setoption":
+            self.setOption(args)
+        elif command == "position":
+            self.stopSearch()
+            self.setPosition(args)
+        elif command == "go":
+            self.stopSearch()
+            self.go(args)
+        elif command == "ponderhit":
+            self.ponderHit()
+        elif command == "stop":
+            self.stopSearch()
+        elif command == "quit":
+            self.stopSearch()
+            return False
+        return True
+
+    def setOption(self, args):
+        if "name" not in args:
+            return
+        nameEnd = args.index("value") if "value" in args else len(args)
+        name = " ".join(args[args.index("name") + 1:nameEnd]).lower()
+        value = " ".join(args[nameEnd + 1:])
+        try:
+            if name == "hash":
+                ChessAI.transpositionTable.resize(max(1, int(value)))
+            elif name == "threads":
+                self.threads = max(1, min(MAX_THREADS, int(value)))
+            elif name == "ownbook":
+                self.ownBook = value.lower() == "true"
+            elif name == "bookfile":
+                ChessAI.loadOpeningBook("" if value == "<empty>" else value)
+        except (ValueError, OSError):
+            self.send("info string bad value %r for option %s" % (value, name))
+
+    def setPosition(self, args):
+        if not args:
+            return
+        if args[0] == "startpos":
+            gs = chess_engine.GameState()
+            rest = args[1:]
+        elif args[0] == "fen":
+            end = args.index("moves") if "moves" in args else len(args)
+            try:
+                gs = chess_engine.GameState.fromFEN(" ".join(args[1:end]))
+            except ValueError as e:
+                self.send("info string %s" % e)
+                return
+            rest = args[end:]
+        else:
+            return
+        if rest and rest[0] == "moves":
+            for text in rest[1:]:
+                move = findMove(gs, text)
+                if move is None:
+                    self.send("info string illegal move %s" % text)
+                    break
+                gs.makeMove(move)
+        self.gs = gs
+
+    def go(self, args):
+        options = {}
+        flags = set()
+        searchMoves = set()
+        i = 0
+        while i < len(args):
+            if args[i] in ("infinite", "ponder"):
+                flags.add(args[i])
+                i += 1
+            elif args[i] == "searchmoves":
+                i += 1
+                while i < len(args) and args[i] not in GO_KEYWORDS:
+                    searchMoves.add(args[i])
+                    i += 1
+            else:
+                if i + 1 < len(args):
+                    try:
+                        options[args[i]] = int(args[i + 1])
+                    except ValueError:
+                        pass
+                i += 2
+
+        timeLimit = None
+        if "movetime" in options:
+            timeLimit = max(0.01, options["movetime"] / 1000.0 - MOVE_OVERHEAD)
+        elif ("wtime" if self.gs.whiteToMove else "btime") in options:
+            side = "w" if self.gs.whiteToMove else "b"
+            timeLimit = timeBudget(options[side + "time"] / 1000.0, options.get(side + "inc", 0) / 1000.0,
+                                   options.get("movestogo"))
+        self.ponderBudget = None
+        if "ponder" in flags:
+            self.ponderBudget, timeLimit = timeLimit, None #the clock only starts on ponderhit
+        if "infinite" in flags or "ponder" in flags:
+            timeLimit = None
+            self.waitForStop.clear()
+        else:
+            self.waitForStop.set()
+
+        self.searchMoves = searchMoves
+        if self.ownBook and not flags and not searchMoves:
+            move = ChessAI.bookMove(self.gs, self.gs.getValidMoves())
+            if move is not None:
+                self.send("info string book move")
+                self.send("bestmove " + uciMove(move))
+                return
+
+        search = ParallelSearch(self.gs, self.threads, timeLimit, options.get("depth", ChessAI.MAX_DEPTH))
+        if "nodes" in options and self.threads == 1:
+            search = ChessAI.Search(self.gs, timeLimit, options["nodes"], options.get("depth", ChessAI.MAX_DEPTH))
+        search.onIteration = self.sendInfo
+        self.lastPV = []
+        self.search = search
+        self.searchStart = time.perf_counter()
+        self.thread = threading.Thread(target=self.runSearch, args=(search,), daemon=True)
+        self.thread.start()
+
+    def runSearch(self, search):
+        validMoves = self.gs.getValidMoves()
+        if self.searchMoves:
+            validMoves = [move for move in validMoves if uciMove(move) in self.searchMoves] or validMoves
+        move = search.run(validMoves)
+        self.waitForStop.wait() #infinite and ponder searches answer only when the GUI says so
+        if move is None:
+            self.send("bestmove 0000")
+            return
+        line = "bestmove " + uciMove(move)
+        if len(self.lastPV) >= 2 and self.lastPV[0] == uciMove(move):
+            line += " ponder " + self.lastPV[1]
+        self.send(line)
+
+    def principalVariation(self, search):
+        if isinstance(search, ChessAI.Search):
+            return [uciMove(chess_engine.Move.fromCode(code)) for code in search.principalVariation()]
+        if getattr(search, 'serial', None) is not None:
+            return self.principalVariation(search.serial)
+        return [uciMove(chess_engine.Move.fromCode(search.bestCode))] if search.bestCode else []
+
+    def sendInfo(self, search):
+        seconds = time.perf_counter() - self.searchStart
+        self.lastPV = self.principalVariation(search)
+        self.send("info depth %d score %s nodes %d nps %d time %d pv %s" % (
+            search.depth, scoreText(search.bestScore), search.nodes, search.nodes / seconds if seconds > 0 else 0,
+            seconds * 1000, " ".join(self.lastPV)))
+
+    def ponderHit(self):
+        self.waitForStop.set()
+        if self.search is not None and self.ponderBudget is not None:
+            self.ponderTimer = threading.Timer(self.ponderBudget, self.search.stop)
+            self.ponderTimer.daemon = True
+            self.ponderTimer.start()
+        elif self.search is not None:
+            self.search.stop() #pondering with no clock given: answer right away
+
+    '''
+    Stops a running search and waits for its bestmove line, so replies never cross the next command
+    '''
+    def stopSearch(self):
+        if self.ponderTimer is not None:
+            self.ponderTimer.cancel()
+            self.ponderTimer = None
+        if self.search is not None:
+            self.search.stop()
+            self.waitForStop.set()
+            self.thread.join()
+            self.search = None
+            self.thread = None
+
+
+def main(argv=None):
+    engine = UCIEngine()
+    for line in sys.stdin:
+        if not engine.handle(line.strip()):
+            break
+    engine.stopSearch()
+    shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,17 @@
+"""
+Random keys for Zobrist hashing. A position's key is the XOR of the keys of everything in it, so a move only has to
+XOR out what changed and XOR in what replaced it.
+"""
+import random
+
+#fixed seed so the same position gets the same key in every run (books and caches on disk rely on it)
+_random = random.Random(20240101)
+
+#one key per piece (in chess_engine.PIECES order) per square
+PIECE_KEYS = [[_random.getrandbits(64) for square in range(64)] for piece in range(12)]
+#XORed in while black is to move
+SIDE_KEY = _random.getrandbits(64)
+#indexed by the castling bits (white king side 1, white queen side 2, black king side 4, black queen side 8)
+CASTLE_KEYS = [_random.getrandbits(64) for bits in range(16)]
+#indexed by the file of the en passant square, only used when a capture there is actually possible
+EN_PASSANT_KEYS = [_random.getrandbits(64) for col in range(8)]
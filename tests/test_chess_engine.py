@@ -0,0 +1,51 @@
+import unittest
+from chess import chess_engine
+
+
+class SetFENTest(unittest.TestCase):
+    def test_round_trip(self):
+        for fen in ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+                    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                    "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3",
+                    "4k3/8/8/8/8/8/8/4K2R b K - 5 40"):
+            self.assertEqual(chess_engine.GameState.fromFEN(fen).getFEN(), fen)
+
+    def test_rejects_side_not_to_move_in_check(self):
+        for fen in ("4k3/4R3/8/8/8/8/8/4K3 w - - 0 1", #white to move could take the king on e8
+                    "4k3/8/8/8/8/8/3p4/4K3 b - - 0 1", #black to move could take the king on e1
+                    "rnbqkbnr/ppppp1pp/8/5p1Q/4P3/8/PPPP1PPP/RNB1KBNR w KQkq - 0 1"):
+            with self.assertRaises(ValueError, msg=fen):
+                chess_engine.GameState.fromFEN(fen)
+
+    def test_rejects_wrong_number_of_kings(self):
+        for fen in ("8/8/8/8/8/8/8/4K3 w - - 0 1", "4k3/8/8/8/8/8/8/8 w - - 0 1",
+                    "4k3/8/8/8/8/8/8/3KK3 w - - 0 1", "3kk3/8/8/8/8/8/8/4K3 b - - 0 1"):
+            with self.assertRaises(ValueError, msg=fen):
+                chess_engine.GameState.fromFEN(fen)
+
+    def test_rejects_malformed_fen(self):
+        for fen in ("", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w KQkq - 0 1",
+                    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x KQkq - 0 1",
+                    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq e5 0 1"):
+            with self.assertRaises(ValueError, msg=fen):
+                chess_engine.GameState.fromFEN(fen)
+
+    def test_rejects_impossible_positions(self):
+        for fen in ("P3k3/8/8/8/8/8/8/4K3 w - - 0 1", "4k3/8/8/8/8/8/8/p3K3 b - - 0 1", #pawns on the back ranks
+                    "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR b KQkq f6 0 3", #en passant on white's side
+                    "4k3/8/8/8/4Pp2/8/8/4K3 b - e6 0 1",
+                    "4k3/8/8/8/8/8/8/4K3 w - - -1 1", "4k3/8/8/8/8/8/8/4K3 w - - 0 -3"):
+            with self.assertRaises(ValueError, msg=fen):
+                chess_engine.GameState.fromFEN(fen)
+
+    def test_drops_castling_rights_without_king_or_rook_at_home(self):
+        for fen, castling in (("4k3/8/8/8/8/8/8/7K w K - 0 1", "-"), ("4k3/8/8/8/8/8/8/R3K3 w KQ - 0 1", "Q"),
+                              ("r3k3/8/8/8/8/8/8/4K2R w KQkq - 0 1", "Kq")):
+            gs = chess_engine.GameState.fromFEN(fen)
+            self.assertEqual(gs.getFEN().split()[2], castling, msg=fen)
+            moves = [move.getChessNotation() for move in gs.getValidMoves()]
+            self.assertEqual("e1g1" in moves, 'K' in castling, msg=fen)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+from chess import chess_engine
+from chess.opening_book import ENTRY, OpeningBook, buildBook, encodeMove
+from chess.polyglot import polyglotKey
+
+#positions and keys from the Polyglot book format description
+KNOWN_KEYS = [
+    ([], 0x463b96181691fc9c),
+    (["e2e4"], 0x823c9b50fd114196),
+    (["e2e4", "d7d5"], 0x0756b94461c50fb0),
+    (["e2e4", "d7d5", "e4e5"], 0x662fafb965db29d4),
+    (["e2e4", "d7d5", "e4e5", "f7f5"], 0x22a48b5a8e47ff78),
+    (["e2e4", "d7d5", "e4e5", "f7f5", "e1e2"], 0x652a607ca3f242c1),
+    (["e2e4", "d7d5", "e4e5", "f7f5", "e1e2", "e8f7"], 0x00fdd303c946bdd9),
+    (["a2a4", "b7b5", "h2h4", "b5b4", "c2c4"], 0x3c8123ea7b067637),
+    (["a2a4", "b7b5", "h2h4", "b5b4", "c2c4", "b4c3", "a1a3"], 0x5c3f9b829b279560),
+]
+
+
+def play(moves):
+    gs = chess_engine.GameState()
+    for notation in moves:
+        gs.makeMove(next(move for move in gs.getValidMoves() if move.getChessNotation() == notation))
+    return gs
+
+
+class OpeningBookTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_polyglot_keys(self):
+        for moves, key in KNOWN_KEYS:
+            self.assertEqual(polyglotKey(play(moves)), key, moves)
+
+    def test_probe_book_with_polyglot_keys(self):
+        #a book written entry by entry with the published keys, as another program would write it
+        path = os.path.join(self.directory.name, "book.bin")
+        start = play([])
+        e4 = next(move for move in start.getValidMoves() if move.getChessNotation() == "e2e4")
+        d4 = next(move for move in start.getValidMoves() if move.getChessNotation() == "d2d4")
+        afterE4 = play(["e2e4"])
+        d5 = next(move for move in afterE4.getValidMoves() if move.getChessNotation() == "d7d5")
+        entries = sorted([(0x463b96181691fc9c, encodeMove(e4), 3), (0x463b96181691fc9c, encodeMove(d4), 1),
+                          (0x823c9b50fd114196, encodeMove(d5), 5)])
+        with open(path, 'wb') as f:
+            for key, polyMove, weight in entries:
+                f.write(ENTRY.pack(key, polyMove, weight, 0))
+        with OpeningBook(path) as book:
+            moves = {move.getChessNotation(): weight for move, weight in book.findMoves(start)}
+            self.assertEqual(moves, {"e2e4": 3, "d2d4": 1})
+            self.assertEqual([move.getChessNotation() for move, _ in book.findMoves(afterE4)], ["d7d5"])
+            self.assertEqual(book.findMoves(play(["d2d4"])), [])
+
+    def test_build_and_probe_round_trip(self):
+        pgnPath = os.path.join(self.directory.name, "games.pgn")
+        bookPath = os.path.join(self.directory.name, "book.bin")
+        with open(pgnPath, 'w') as f:
+            f.write('[Result "1/2-1/2"]\n\n1. e4 e5 2. Nf3 Nc6 1/2-1/2\n\n[Result "0-1"]\n\n1. e4 c5 0-1\n')
+        self.assertEqual(buildBook([pgnPath], bookPath, maxPlies=4), 5)
+        with OpeningBook(bookPath) as book:
+            start = play([])
+            self.assertEqual([move.getChessNotation() for move, _ in book.findMoves(start)], ["e2e4"])
+            replies = {move.getChessNotation() for move, _ in book.findMoves(play(["e2e4"]))}
+            self.assertEqual(replies, {"e7e5", "c7c5"})
+            keys = [ENTRY.unpack_from(book.data, i * ENTRY.size)[0] for i in range(len(book))]
+            self.assertEqual(keys, sorted(keys))
+            self.assertIn(0x823c9b50fd114196, keys)
+
+
+if __name__ == "__main__":
+    unittest.main()